@@ -0,0 +1,259 @@
+"""
+Métriques par route (nombre de requêtes, latence, requêtes SQL, temps base de données, taille
+des réponses) et du worker d'emails, exposées sur /metrics au format texte Prometheus.
+
+Chaque processus agrège en mémoire puis écrit régulièrement son instantané dans METRICS_DIR
+(un fichier par processus, remplacé atomiquement) ; /metrics additionne tous les fichiers, donc
+les workers gunicorn et send_queued_mail apparaissent ensemble. Vider METRICS_DIR au déploiement.
+"""
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# nom -> (type, aide, seuils des histogrammes)
+METRICS = {
+    'http_requests_total': ('counter', "Requêtes HTTP traitées", None),
+    'http_request_duration_seconds': ('histogram', "Durée des requêtes HTTP", DURATION_BUCKETS),
+    'http_request_db_queries': ('histogram', "Requêtes SQL par requête HTTP", QUERY_BUCKETS),
+    'http_request_db_seconds_total': ('counter', "Temps passé dans la base de données", None),
+    'http_response_size_bytes': ('histogram', "Taille des réponses (hors flux sans Content-Length)", SIZE_BUCKETS),
+    'mail_send_seconds': ('histogram', "Durée d'envoi d'un lot d'emails (send_queued_mail)", DURATION_BUCKETS),
+    'mail_jobs_total': ('counter', "Emails traités par le worker", None),
+}
+
+FLUSH_SECONDS = getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+FORWARDED_HEADERS = ('HTTP_X_FORWARDED_FOR', 'HTTP_X_REAL_IP', 'HTTP_FORWARDED')
+
+
+class Registry:
+    """Compteurs et histogrammes du processus, protégés par un verrou (serveurs multi-threads)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.pid = os.getpid()
+        self.process_id = f'{self.pid}-{uuid.uuid4().hex[:8]}'
+        self.flushed_at = time.monotonic()
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.maybe_flush()
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = METRICS[name][2]
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(buckets), 0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][i] += 1  # Seuils cumulatifs, comme le format Prometheus
+            histogram[1] += value
+            histogram[2] += 1
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, *histogram] for (name, labels), histogram in self.histograms.items()],
+            }
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed_at >= FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        """Écrit l'instantané du processus dans METRICS_DIR (remplacement atomique)."""
+        self.flushed_at = time.monotonic()
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(self.snapshot(), tmp)
+        os.replace(tmp_path, os.path.join(directory, f'{self.process_id}.json'))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Registre du processus courant ; un processus forké repart de zéro (pas de double comptage)."""
+    global _registry
+    if _registry is None or _registry.pid != os.getpid():
+        with _registry_lock:
+            if _registry is None or _registry.pid != os.getpid():
+                _registry = Registry()
+    return _registry
+
+
+def inc(name, value=1, **labels):
+    get_registry().inc(name, labels, value)
+
+
+def observe(name, value, **labels):
+    get_registry().observe(name, labels, value)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _registry is not None and _registry.pid == os.getpid():
+        _registry.flush()
+
+
+def collect():
+    """Instantanés de tous les processus (METRICS_DIR), additionnés ; sinon le seul processus courant."""
+    registry = get_registry()
+    directory = getattr(settings, 'METRICS_DIR', None)
+    snapshots = []
+    if directory:
+        registry.flush()
+        for filename in os.listdir(directory) if os.path.isdir(directory) else ():
+            if filename.endswith('.json'):
+                try:
+                    with open(os.path.join(directory, filename)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):  # Fichier supprimé ou remplacé pendant la lecture
+                    continue
+    else:
+        snapshots.append(registry.snapshot())
+
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(counters, histograms):
+    """Format texte d'exposition Prometheus (version 0.0.4)."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        else:
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {bucket_count}')
+                lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {count}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+                lines.append(f'{name}_count{_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def is_allowed(request):
+    """
+    Avec METRICS_TOKEN : jeton Bearer exigé. Sans : requête directe depuis METRICS_ALLOWED_IPS.
+    Une requête relayée par un proxy local arrive elle aussi de 127.0.0.1 ; elle porte un en-tête
+    de transfert et est refusée (proxies qui n'en ajoutent pas : METRICS_TOKEN obligatoire).
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
+    if any(header in request.META for header in FORWARDED_HEADERS):
+        return False
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+
+
+def metrics_view(request):
+    """Point d'entrée /metrics, réservé au collecteur Prometheus (voir is_allowed)."""
+    if not is_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(*collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class QueryTimer:
+    """execute_wrapper : compte les requêtes SQL et leur durée."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Mesure chaque requête par route (motif d'URL, pas le chemin : cardinalité bornée).
+    Les requêtes SQL exécutées pendant l'envoi d'une réponse en flux ne sont pas comptées.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else '<unmatched>'
+        labels = {'route': route, 'method': request.method}
+        inc('http_requests_total', **labels, status=response.status_code)
+        observe('http_request_duration_seconds', elapsed, **labels)
+        observe('http_request_db_queries', timer.count, **labels)
+        inc('http_request_db_seconds_total', timer.seconds, **labels)
+        if not response.streaming:
+            observe('http_response_size_bytes', len(response.content), **labels)
+        elif response.has_header('Content-Length'):
+            observe('http_response_size_bytes', int(response['Content-Length']), **labels)
+        return response
@@ -0,0 +1,197 @@
+"""
+Profilage à la demande d'une requête (en-tête "X-Profile: 1" ou paramètre ?profile=1),
+réservé aux superadmins authentifiés par JWT. Le profil (cProfile, déterministe) et les
+requêtes SQL avec leur durée sont enregistrés dans PROFILE_DIR ; la réponse porte l'en-tête
+X-Profile-Id pour les télécharger (profiles/<id>/ et profiles/<id>/download/).
+Sans le drapeau, le coût se limite à deux lectures de dictionnaire par requête.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from types import SimpleNamespace
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from authentification.authentication import StatelessJWTAuthentication
+from authentification.roles import SUPERADMIN, IsSuperAdmin, has_role
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+PROFILE_MAX_COUNT = getattr(settings, 'PROFILE_MAX_COUNT', 100)  # Les plus anciens sont supprimés
+PROFILE_TOP_FUNCTIONS = 40
+
+# Un seul profil à la fois : cProfile est global au thread, et exclusif à partir de Python 3.12
+_profile_lock = threading.Lock()
+
+
+def profile_dir():
+    return str(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def is_requested(request):
+    # "X-Profile: 0" ou "?profile=" ne déclenchent rien : seule la valeur 1 est un drapeau
+    return request.META.get(PROFILE_HEADER) == '1' or request.GET.get(PROFILE_PARAM) == '1'
+
+
+def requested_by_superadmin(request):
+    """Jeton JWT du demandeur vérifié ici : la vue DRF n'a pas encore authentifié la requête."""
+    try:
+        authenticated = StatelessJWTAuthentication().authenticate(request)
+    except (InvalidToken, TokenError):
+        return None
+    if authenticated is None:
+        return None
+    user, token = authenticated
+    if not has_role(SimpleNamespace(user=user, auth=token), SUPERADMIN):
+        return None
+    return user
+
+
+class SQLRecorder:
+    """execute_wrapper : texte de chaque requête SQL (sans paramètres) et sa durée."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'sql': sql, 'duration_ms': round((time.perf_counter() - start) * 1000, 3)})
+
+
+def save_profile(profiler, recorder, request, response, user, duration):
+    profile_id = str(uuid.uuid4())
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))  # Lisible par pstats, snakeviz, gprof2dot
+
+    stats_text = io.StringIO()
+    pstats.Stats(profiler, stream=stats_text).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    summary = {
+        'id': profile_id,
+        'created_at': timezone.now().isoformat(),
+        'user': user.email,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'sql_count': len(recorder.queries),
+        'sql_duration_ms': round(sum(query['duration_ms'] for query in recorder.queries), 3),
+        'sql': recorder.queries,
+        'stats': stats_text.getvalue(),
+    }
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w') as f:
+        json.dump(summary, f)
+    prune_profiles(directory)
+    return profile_id
+
+
+def prune_profiles(directory):
+    summaries = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.json')),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in summaries[:max(0, len(summaries) - PROFILE_MAX_COUNT)]:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, entry.name[:-len('.json')] + extension))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """
+    Profile la requête entière (middlewares suivants et vue). Le corps d'une réponse en flux
+    est produit après le retour du middleware et n'est donc pas inclus.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_requested(request):
+            return self.get_response(request)
+        user = requested_by_superadmin(request)
+        if user is None or not _profile_lock.acquire(blocking=False):
+            return self.get_response(request)  # Drapeau ignoré : non autorisé, ou profil déjà en cours
+        try:
+            recorder = SQLRecorder()
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            duration = time.perf_counter() - start
+            response['X-Profile-Id'] = save_profile(profiler, recorder, request, response, user, duration)
+            return response
+        finally:
+            _profile_lock.release()
+
+
+def load_summary(pk):
+    try:
+        with open(os.path.join(profile_dir(), f'{pk}.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class ProfileListView(APIView):
+    """Profils enregistrés, du plus récent au plus ancien (sans le détail SQL ni les statistiques)."""
+    permission_classes = [IsAuthenticated, IsSuperAdmin]
+
+    def get(self, request):
+        directory = profile_dir()
+        if not os.path.isdir(directory):
+            return Response([])
+        profiles = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.json'):
+                summary = load_summary(entry.name[:-len('.json')])
+                if summary is not None:
+                    summary.pop('sql')
+                    summary.pop('stats')
+                    profiles.append(summary)
+        profiles.sort(key=lambda summary: summary['created_at'], reverse=True)
+        return Response(profiles)
+
+
+class ProfileDetailView(APIView):
+    """Résumé d'un profil : requêtes SQL avec leur durée et fonctions les plus coûteuses."""
+    permission_classes = [IsAuthenticated, IsSuperAdmin]
+
+    def get(self, request, pk):
+        summary = load_summary(pk)
+        if summary is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(summary)
+
+
+class ProfileDownloadView(APIView):
+    """Fichier cProfile brut (.prof)."""
+    permission_classes = [IsAuthenticated, IsSuperAdmin]
+
+    def get(self, request, pk):
+        path = os.path.join(profile_dir(), f'{pk}.prof')
+        if not os.path.exists(path):
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{pk}.prof')
@@ -10,8 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,7 +45,9 @@ CORS_ALLOW_HEADERS = [
     'content-type',
     'accept',
     'authorization',
+    'x-profile',
 ]
+CORS_EXPOSE_HEADERS = ['X-Profile-Id', 'X-Result-Truncated']
 
 # settings.py
 AUTH_USER_MODEL = 'authentification.User'
@@ -61,6 +65,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'authentification',
     'demande',
+    'notifications',
     'rest_framework',
     'rest_framework.authtoken',
     "rest_framework_simplejwt.token_blacklist", 
@@ -68,6 +73,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Projet_de_stage.metrics.MetricsMiddleware',  # En premier : mesure toute la pile
+    'Projet_de_stage.profiling.ProfilingMiddleware',  # X-Profile: 1 ou ?profile=1 (superadmin)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -156,7 +163,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentification.authentication.StatelessJWTAuthentication',  # Sans lecture de la table User
         'rest_framework.authentication.TokenAuthentication',
     ),
     'DEFAULT_RENDERER_CLASSES': [
@@ -172,8 +179,22 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     'USER_ID_CLAIM': 'user_id',
     'TOKEN_OBTAIN_SERIALIZER': 'authentification.serializers.CustomTokenObtainPairSerializer',
+    # Contrôle de blacklist via le filtre en mémoire (authentification/blacklist.py)
+    'TOKEN_REFRESH_SERIALIZER': 'authentification.blacklist.FilteredTokenRefreshSerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'authentification.blacklist.FilteredTokenBlacklistSerializer',
     'SIGNING_KEY': SECRET_KEY,
+    'TOKEN_USER_CLASS': 'authentification.authentication.ClaimsUser',
 }
+JWT_VERIFIED_TOKEN_CACHE_SIZE = 4096  # Jetons dont la signature a déjà été vérifiée (par processus)
+
+# Secret de la permutation des clés de suivi (demande/keys.py), lu dans l'environnement et distinct de
+# SECRET_KEY (qui peut être renouvelée). NE JAMAIS LE CHANGER une fois des clés attribuées : la nouvelle
+# permutation redonnerait des clés déjà utilisées. Obligatoire hors DEBUG.
+DEMANDE_KEY_SECRET = os.environ.get('DEMANDE_KEY_SECRET')
+if not DEMANDE_KEY_SECRET:
+    if not DEBUG:
+        raise ImproperlyConfigured("La variable d'environnement DEMANDE_KEY_SECRET doit être définie (DEBUG désactivé)")
+    DEMANDE_KEY_SECRET = SECRET_KEY  # Développement uniquement : mêmes clés qu'avant
 
 LOGGING = {
     'version': 1,
@@ -190,9 +211,34 @@ LOGGING = {
 }
 MEDIA_URL = '/media/'  # URL pour accéder aux fichiers
 MEDIA_ROOT = BASE_DIR / 'media'  # Chemin absolu où les fichiers seront stockés
+MUNICIPALITES_VERSION_TTL = 2  # Secondes pendant lesquelles un processus réutilise la version de la liste des municipalités
+JWT_BLACKLIST_VERSION_TTL = 2  # Secondes pendant lesquelles un processus réutilise la version de la blacklist des refresh tokens
+# GET /demandes/ sans pagination : lignes au plus (en-tête X-Result-Truncated au-delà). Pas de limite tant que
+# la page demandes du front filtre le tableau complet côté client ; à fixer (ex. 1000) après son passage à ?cursor=
+DEMANDE_LIST_MAX_ROWS = None
+DEMANDE_UPLOAD_DIR = BASE_DIR / 'uploads'  # Envois par morceaux en cours (hors MEDIA_ROOT, non servis)
+DEMANDE_UPLOAD_MAX_SIZE = 50 * 1024 * 1024  # Taille maximale d'une pièce jointe (octets)
+# Téléchargement des pièces jointes délégué au serveur web (ex. 'X-Accel-Redirect' avec nginx) ; None : servi par Django
+DEMANDE_SENDFILE_HEADER = None
+DEMANDE_SENDFILE_PREFIX = '/protected/'  # Location interne nginx pointant sur MEDIA_ROOT
+DEMANDE_ATTACHMENT_URL_MAX_AGE = 60 * 60  # Durée de validité (secondes) des URLs signées de pièces jointes (miniatures)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'malekhichri2003@gmail.com'
 EMAIL_HOST_PASSWORD = 'qpik mkbu uvvk vfrf'
+
+# Métriques Prometheus (Projet_de_stage/metrics.py, exposées sur /metrics)
+# Instantanés des métriques, un fichier par processus (à vider au déploiement). Sans dossier : métriques
+# du seul processus qui répond ; à définir dès qu'il y a plusieurs workers ou le worker d'emails
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+# Jeton attendu dans "Authorization: Bearer ..." (bearer_token du collecteur Prometheus). Sans jeton,
+# seules les requêtes directes (sans en-tête de proxy) depuis METRICS_ALLOWED_IPS sont acceptées :
+# derrière nginx, toutes les requêtes viennent de 127.0.0.1, le jeton est alors indispensable
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+# Profilage à la demande (Projet_de_stage/profiling.py)
+PROFILE_DIR = BASE_DIR / 'profiles'  # Profils enregistrés (.prof et résumé .json)
+PROFILE_MAX_COUNT = 100  # Au-delà, les plus anciens sont supprimés
@@ -16,9 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path , include 
+from .metrics import metrics_view
+from .profiling import ProfileDetailView, ProfileDownloadView, ProfileListView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('profiles/', ProfileListView.as_view(), name='profiles'),
+    path('profiles/<uuid:pk>/', ProfileDetailView.as_view(), name='profile_detail'),
+    path('profiles/<uuid:pk>/download/', ProfileDownloadView.as_view(), name='profile_download'),
     path('', include('authentification.urls')),
     path('' , include('demande.urls')),
 ]
@@ -0,0 +1,59 @@
+from functools import lru_cache
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.utils import aware_utcnow
+
+VERIFIED_TOKEN_CACHE_SIZE = getattr(settings, 'JWT_VERIFIED_TOKEN_CACHE_SIZE', 4096)
+
+
+class ClaimsUser(TokenUser):
+    """
+    Utilisateur construit depuis les revendications vérifiées du jeton (user_id, email, groups),
+    sans lecture de la table User. Les vues qui ont besoin de la ligne complète utilisent load_user().
+    """
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @property
+    def groups(self):
+        return Group.objects.filter(user=self.pk)
+
+    def __str__(self):
+        return self.email
+
+
+@lru_cache(maxsize=VERIFIED_TOKEN_CACHE_SIZE)
+def verify_token(raw_token):
+    """Signature et type du jeton vérifiés une fois ; les jetons invalides ne sont pas mémorisés (exception)."""
+    return JWTAuthentication().get_validated_token(raw_token)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authentification JWT sans requête : l'utilisateur (ClaimsUser, via TOKEN_USER_CLASS) vient du jeton, et les
+    jetons déjà vérifiés sont gardés dans un LRU borné (JWT_VERIFIED_TOKEN_CACHE_SIZE).
+    Seule l'expiration est recontrôlée à chaque requête. Un compte supprimé ou désactivé
+    garde donc l'accès jusqu'à l'expiration de son jeton d'accès (ACCESS_TOKEN_LIFETIME).
+    """
+
+    def get_validated_token(self, raw_token):
+        token = verify_token(raw_token)
+        try:
+            token.check_exp(current_time=aware_utcnow())  # Heure courante, pas celle de la première vérification
+        except TokenError as e:
+            raise InvalidToken({'detail': str(e)})
+        return token
+
+
+def load_user(user):
+    """Ligne User complète de l'utilisateur authentifié (une requête si l'authentification est sans état)."""
+    from .models import User
+    if isinstance(user, ClaimsUser):
+        return User.objects.get(pk=user.pk)
+    return user
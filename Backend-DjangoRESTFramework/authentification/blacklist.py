@@ -0,0 +1,133 @@
+import hashlib
+import math
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenBlacklistSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+BLACKLIST_VERSION_SEQUENCE = 'jwt_blacklist_version_seq'  # Créée par la migration 0004
+# Un processus réutilise la version lue pendant ce délai (secondes) : jeton blacklisté par un
+# autre processus refusé au plus tard après ce délai, sans requête par contrôle entre-temps
+BLACKLIST_VERSION_TTL = getattr(settings, 'JWT_BLACKLIST_VERSION_TTL', 2)
+FILTER_ERROR_RATE = 0.01
+FILTER_MIN_CAPACITY = 10000
+# Reconstruction complète périodique : oublie les jetons purgés (prune_tokens)
+FILTER_REBUILD_SECONDS = getattr(settings, 'JWT_BLACKLIST_FILTER_REBUILD_SECONDS', 600)
+# Les id sont attribués à l'INSERT mais visibles au COMMIT : on relit les derniers id au cas où
+# une transaction plus ancienne aurait validé après une plus récente
+SYNC_ID_OVERLAP = 50
+
+
+class BloomFilter:
+    """Filtre de Bloom : "absent" est certain, "présent" est à confirmer (faux positifs ~error_rate)."""
+
+    def __init__(self, capacity, error_rate=FILTER_ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8 + 1)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class BlacklistFilter:
+    """
+    JTI des refresh tokens blacklistés, en mémoire du processus. Chaque blacklist incrémente
+    une séquence PostgreSQL (signal, après commit), partagée par tous les processus ; elle est
+    relue au plus une fois toutes les BLACKLIST_VERSION_TTL secondes. Tant qu'elle n'a pas changé,
+    un contrôle ne fait aucune requête ; sinon seules les nouvelles lignes sont chargées.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.version = None
+        self.version_read_at = 0
+        self.last_id = 0
+        self.built_at = 0
+
+    def rebuild(self):
+        rows = list(BlacklistedToken.objects.values_list('id', 'token__jti'))
+        self.bloom = BloomFilter(max(FILTER_MIN_CAPACITY, 2 * len(rows)))
+        self.last_id = 0
+        self.add_rows(rows)
+        self.built_at = time.monotonic()
+
+    def add_rows(self, rows):
+        for row_id, jti in rows:
+            self.bloom.add(jti)
+            self.last_id = max(self.last_id, row_id)
+
+    def read_version(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.version_read_at < BLACKLIST_VERSION_TTL:
+            return self.version
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT last_value, is_called FROM {BLACKLIST_VERSION_SEQUENCE}')
+            last_value, is_called = cursor.fetchone()
+        self.version_read_at = now
+        return last_value if is_called else 0
+
+    def sync(self):
+        version = self.read_version()
+        with self.lock:
+            if self.bloom is None or time.monotonic() - self.built_at > FILTER_REBUILD_SECONDS:
+                self.rebuild()
+            elif version != self.version:
+                self.add_rows(
+                    BlacklistedToken.objects.filter(id__gt=self.last_id - SYNC_ID_OVERLAP)
+                    .values_list('id', 'token__jti')
+                )
+                if self.bloom.count > self.bloom.capacity:
+                    self.rebuild()  # Taux de faux positifs trop élevé : filtre agrandi
+            self.version = version
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti in self.bloom
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def bump_blacklist_version():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [BLACKLIST_VERSION_SEQUENCE])
+    blacklist_filter.version_read_at = 0  # Ce processus relit la version au prochain contrôle
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken dont le contrôle de blacklist passe d'abord par le filtre en mémoire."""
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if not blacklist_filter.might_contain(jti):
+            return  # Cas courant : absent à coup sûr, aucune requête
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            raise TokenError(_("Token is blacklisted"))
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+class FilteredTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = FilteredRefreshToken
@@ -0,0 +1,28 @@
+from django.contrib.auth.models import Group
+from django.db.models import OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import User
+
+NO_ROLE = "No Role"
+USER_FIELDS = ('id', 'email', 'nom', 'prenom', 'numero_telephone', 'role')
+
+
+def user_directory(params=None):
+    """
+    Annuaire des utilisateurs (dictionnaires USER_FIELDS) en une seule requête : le rôle
+    (premier groupe, comme user.groups.first()) est une sous-requête, pas une requête par ligne.
+    Filtres : ?q= (email, nom ou prénom contient) et ?role= (nom de groupe).
+    """
+    first_group = Group.objects.filter(user=OuterRef('pk')).order_by('pk').values('name')[:1]
+    users = User.objects.annotate(role=Coalesce(Subquery(first_group), Value(NO_ROLE)))
+    params = params or {}
+    text = params.get('q', '').strip()
+    if text:
+        users = users.filter(Q(email__icontains=text) | Q(nom__icontains=text) | Q(prenom__icontains=text))
+    role = params.get('role')
+    if role == NO_ROLE:
+        users = users.filter(groups__isnull=True)
+    elif role:
+        # Sous-requête plutôt que jointure : pas de doublon si l'utilisateur a plusieurs groupes
+        users = users.filter(pk__in=User.groups.through.objects.filter(group__name=role).values('user_id'))
+    return users.order_by('email').values(*USER_FIELDS)
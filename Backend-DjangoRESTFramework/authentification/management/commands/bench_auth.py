@@ -0,0 +1,61 @@
+import time
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from authentification.authentication import StatelessJWTAuthentication, verify_token
+from authentification.models import User
+from authentification.serializers import CustomTokenObtainPairSerializer
+from demande.views import DemandeTotaleView, MunicipaliteView
+
+STACKS = {
+    'JWTAuthentication + TokenAuthentication': [JWTAuthentication, TokenAuthentication],
+    'StatelessJWTAuthentication + TokenAuthentication': [StatelessJWTAuthentication, TokenAuthentication],
+}
+
+
+class Command(BaseCommand):
+    help = "Compare le débit des requêtes authentifiées (JWT) selon la pile d'authentification"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        # Utilisateur de test créé puis annulé dans une transaction
+        with transaction.atomic():
+            user = User.objects.create_user(email='bench-auth@example.com', password='bench')
+            user.groups.add(Group.objects.get_or_create(name='superadmin')[0])
+            token = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+
+            self.stdout.write(f"{'stack':<50} {'endpoint':<22} {'req/s':>8} {'queries/req':>12}")
+            for label, stack in STACKS.items():
+                verify_token.cache_clear()
+                for endpoint, view in (
+                    ('demandes/total/ GET', DemandeTotaleView.as_view(authentication_classes=stack)),
+                    ('municipalites/ POST', MunicipaliteView.as_view(authentication_classes=stack)),
+                ):
+                    method = factory.get if endpoint.endswith('GET') else factory.post
+                    # POST sans corps : refusé à la validation, après authentification et contrôle du rôle
+                    view(method('/', HTTP_AUTHORIZATION=f'Bearer {token}'))  # Préchauffage
+                    queries.clear()
+                    start = time.perf_counter()
+                    with connection.execute_wrapper(count_queries):
+                        for _ in range(options['requests']):
+                            response = view(method('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+                    elapsed = time.perf_counter() - start
+                    if response.status_code >= 401 and response.status_code != 400:
+                        self.stderr.write(f'{label} {endpoint}: {response.status_code}')
+                    self.stdout.write(
+                        f"{label:<50} {endpoint:<22} {options['requests'] / elapsed:>8.0f} "
+                        f"{len(queries) / options['requests']:>12.1f}"
+                    )
+            transaction.set_rollback(True)
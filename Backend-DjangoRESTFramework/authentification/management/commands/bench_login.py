@@ -0,0 +1,97 @@
+import logging
+import time
+from unittest import mock
+from django.contrib.auth import base_user
+from django.contrib.auth.models import Group, Permission
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from authentification.models import User
+from authentification.roles import add_group_claims
+from authentification.views import LoginView
+
+logger = logging.getLogger('authentification.serializers')
+
+
+class LegacyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    # Ancienne connexion : deux paires de jetons, groupes lus trois fois, permissions en deux requêtes
+    @classmethod
+    def get_token(cls, user):
+        token = add_group_claims(RefreshToken.for_user(user), user)
+        logger.debug(f"Customized access token payload: {token.access_token.payload}")
+        return token
+
+    def validate(self, attrs):
+        logger.debug(f"Validating attrs: {attrs}")
+        data = super().validate(attrs)
+        refresh = self.get_token(self.user)
+        data = {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            "email": self.user.email,
+            "groups": [group.name for group in self.user.groups.all()] if self.user.groups.exists() else [],
+            "permissions": list(self.user.get_all_permissions()),
+        }
+        logger.debug(f"Response data: {data}")
+        return data
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit des connexions (LoginView) et sépare le hachage du mot de passe du reste"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50)
+        parser.add_argument('--log-level', default='INFO', help="Niveau du logger authentification.serializers")
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        logger.setLevel(options['log_level'])
+        hashing = []
+        queries = []
+        real_check_password = base_user.check_password
+
+        def timed_check_password(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return real_check_password(*args, **kwargs)
+            finally:
+                hashing.append(time.perf_counter() - start)
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        # Utilisateur de test créé puis annulé dans une transaction
+        with transaction.atomic():
+            user = User.objects.create_user(email='bench-login@example.com', password='bench')
+            group = Group.objects.get_or_create(name='superadmin')[0]
+            user.groups.add(group)
+            user.user_permissions.add(*Permission.objects.all()[:5])
+            body = {'email': 'bench-login@example.com', 'password': 'bench'}
+
+            self.stdout.write(f"{'serializer':<34} {'logins/s':>9} {'queries':>8} {'hash ms':>8} {'other ms':>9}")
+            for label, serializer_class in (
+                ('legacy (double token)', LegacyTokenObtainPairSerializer),
+                ('CustomTokenObtainPairSerializer', LoginView.serializer_class),
+            ):
+                view = LoginView.as_view(serializer_class=serializer_class)
+                view(factory.post('/', body, format='json'))  # Préchauffage
+                hashing.clear()
+                queries.clear()
+                with mock.patch.object(base_user, 'check_password', timed_check_password), \
+                        connection.execute_wrapper(count_queries):
+                    start = time.perf_counter()
+                    for _ in range(options['logins']):
+                        response = view(factory.post('/', body, format='json'))
+                    elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    self.stderr.write(f'{label}: {response.status_code}')
+                logins = options['logins']
+                hash_ms = sum(hashing) / logins * 1000
+                self.stdout.write(
+                    f"{label:<34} {logins / elapsed:>9.1f} {len(queries) / logins:>8.1f} "
+                    f"{hash_ms:>8.2f} {elapsed / logins * 1000 - hash_ms:>9.2f}"
+                )
+            transaction.set_rollback(True)
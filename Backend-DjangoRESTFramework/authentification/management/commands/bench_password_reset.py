@@ -0,0 +1,57 @@
+import time
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from authentification.models import User
+from authentification.tokens import custom_token_generator, get_user_for_reset, make_reset_uid
+
+
+def legacy_get_user_from_token(token):
+    # Ancienne résolution : un HMAC par utilisateur jusqu'à trouver le bon
+    for user in User.objects.all():
+        if default_token_generator.check_token(user, token):
+            return user
+    return None
+
+
+class Command(BaseCommand):
+    help = "Mesure la résolution d'un jeton de réinitialisation selon le nombre d'utilisateurs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,10000,100000,1000000')
+        parser.add_argument('--legacy-max', type=int, default=10000, help="Parcours complet mesuré jusqu'à N utilisateurs")
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def timed(self, resolve, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            user = resolve()
+        return (time.perf_counter() - start) / repeat * 1000, user
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        self.stdout.write(f"{'users':>9} {'uidb64 + token (ms)':>20} {'full scan (ms)':>15}")
+        # Utilisateurs de test créés puis annulés dans une transaction
+        with transaction.atomic():
+            created = User.objects.count()
+            target = None
+            for size in sizes:
+                while created < size:
+                    batch = min(10000, size - created)
+                    User.objects.bulk_create(
+                        User(email=f'bench-reset-{created + i}@example.com', password='!') for i in range(batch)
+                    )
+                    created += batch
+                if target is None:
+                    target = User.objects.create_user(email='bench-reset@example.com', password='bench')
+                    created += 1
+                uidb64, token = make_reset_uid(target), custom_token_generator.make_token(target)
+                new_ms, user = self.timed(lambda: get_user_for_reset(uidb64, token), options['repeat'])
+                assert user == target
+                legacy = '-'
+                if size <= options['legacy_max']:
+                    # Jeton invalide (cas d'un attaquant) : tous les utilisateurs sont parcourus
+                    legacy_ms, _ = self.timed(lambda: legacy_get_user_from_token('invalide-' + token), 3)
+                    legacy = f'{legacy_ms:.1f}'
+                self.stdout.write(f"{created:>9} {new_ms:>20.3f} {legacy:>15}")
+            transaction.set_rollback(True)
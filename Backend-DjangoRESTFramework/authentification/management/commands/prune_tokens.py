@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime par lots les refresh tokens expirés (OutstandingToken et leur BlacklistedToken). "
+        "Contrairement à flushexpiredtokens, chaque lot est une transaction courte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0, help="Pause entre deux lots (secondes)")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        last_id = 0
+        outstanding = blacklisted = 0
+        while True:
+            # Parcours par id croissant : chaque lot reprend après le précédent, sans rescanner
+            ids = list(
+                OutstandingToken.objects.filter(id__gt=last_id, expires_at__lt=now)
+                .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+                outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        # Le filtre de blacklist (authentification/blacklist.py) oublie ces JTI à sa prochaine reconstruction
+        self.stdout.write(self.style.SUCCESS(
+            f"{outstanding} jetons expirés supprimés ({blacklisted} blacklistés)"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentification', '0003_user_nom_user_numero_telephone_user_prenom'),
+    ]
+
+    operations = [
+        # Version de la blacklist des refresh tokens, incrémentée après chaque blacklist (authentification/blacklist.py)
+        migrations.RunSQL(
+            'CREATE SEQUENCE jwt_blacklist_version_seq',
+            'DROP SEQUENCE jwt_blacklist_version_seq',
+        ),
+    ]
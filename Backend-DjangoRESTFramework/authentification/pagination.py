@@ -0,0 +1,14 @@
+from rest_framework.pagination import PageNumberPagination
+
+
+class UserPagination(PageNumberPagination):
+    """Annuaire des utilisateurs, trié par email, paginé par numéro de page."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    # Le mode paginé est activé dès que l'un de ces paramètres est présent
+    query_params = ('page', 'page_size')
+
+    def is_requested(self, request):
+        return any(param in request.query_params for param in self.query_params)
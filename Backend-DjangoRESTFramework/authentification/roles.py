@@ -0,0 +1,80 @@
+from django.contrib.auth.models import Group, Permission
+from django.db.models import CharField, Value
+from rest_framework import permissions
+
+SUPERADMIN = 'superadmin'
+ADMIN = 'admin'
+
+
+def group_names(user):
+    return [group.name for group in user.groups.all()]
+
+
+def load_groups_and_permissions(user):
+    """
+    Noms de groupes et permissions ("app_label.codename", comme user.get_all_permissions())
+    de l'utilisateur, en une seule requête (UNION) au lieu de trois avec ModelBackend.
+    """
+    if user.is_superuser:  # Toutes les permissions : cas rare, chemin standard
+        return group_names(user), sorted(user.get_all_permissions())
+    group_rows = Group.objects.filter(user=user).values_list(
+        'permissions__content_type__app_label', 'permissions__codename', 'name'
+    )
+    # Annotation en dernière colonne : Django place les annotations après les champs dans le SELECT
+    user_rows = Permission.objects.filter(user=user).annotate(
+        group_name=Value(None, output_field=CharField())
+    ).values_list('content_type__app_label', 'codename', 'group_name')
+    groups, permissions = set(), set()
+    for app_label, codename, group in group_rows.union(user_rows, all=True):
+        if group is not None:
+            groups.add(group)
+        if codename is not None:
+            permissions.add(f'{app_label}.{codename}')
+    return sorted(groups), sorted(permissions)
+
+
+def add_group_claims(token, user, groups=None):
+    """Ajoute au jeton les rôles (noms de groupes, chargés si non fournis) et l'email de l'utilisateur."""
+    token['groups'] = group_names(user) if groups is None else list(groups)
+    token['email'] = user.email
+    return token
+
+
+def get_roles(request):
+    """
+    Rôles de l'utilisateur de la requête. Lus dans la revendication "groups" du JWT
+    (aucune requête), sinon chargés une seule fois puis mémorisés sur la requête.
+    Un changement de rôle s'applique donc aux jetons émis après la modification.
+    """
+    django_request = getattr(request, '_request', request)  # Même mémo pour la vue et les permissions
+    roles = getattr(django_request, '_roles', None)
+    if roles is None:
+        claims = getattr(request, 'auth', None)
+        if not request.user or not request.user.is_authenticated:
+            roles = frozenset()
+        elif hasattr(claims, 'payload') and 'groups' in claims.payload:
+            roles = frozenset(claims.payload['groups'])
+        else:  # Jeton sans revendication (TokenAuthentication, anciens JWT)
+            roles = frozenset(request.user.groups.values_list('name', flat=True))
+        django_request._roles = roles
+    return roles
+
+
+def has_role(request, role):
+    return role in get_roles(request)
+
+
+class IsSuperAdmin(permissions.BasePermission):
+    """
+    Custom permission for superadmin users, allowing full access (POST, PUT, DELETE).
+    """
+    def has_permission(self, request, view):
+        return has_role(request, SUPERADMIN)
+
+
+class IsAdmin(permissions.BasePermission):
+    """
+    Custom permission for admin users, allowing partial access (POST, PUT, DELETE for certain views).
+    """
+    def has_permission(self, request, view):
+        return has_role(request, ADMIN)
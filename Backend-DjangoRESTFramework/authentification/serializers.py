@@ -1,18 +1,17 @@
-from datetime import timedelta
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import User
 from django.contrib.auth.hashers import make_password
-from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
-from django.contrib.auth import get_user_model
-from django.utils.encoding import force_str, smart_str
+from notifications.mail import queue_mail
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.core.exceptions import ValidationError
-from django.utils.timezone import now
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenObtainSerializer
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.contrib.auth.models import update_last_login
+from .roles import add_group_claims, load_groups_and_permissions
+from .tokens import custom_token_generator, get_user_for_reset, make_reset_uid
 import logging
 
 logger = logging.getLogger(__name__)
@@ -45,9 +44,10 @@ class PasswordResetRequestSerializer(serializers.Serializer):
         try:
             email = self.validated_data['email']
             user = User.objects.get(email=email)
-            token = default_token_generator.make_token(user)
-            reset_link = f"http://127.0.0.1:8000/authentification/reset-password/{token}/"
-            send_mail(
+            token = custom_token_generator.make_token(user)
+            # L'identifiant (uidb64) voyage avec le jeton : la vérification ne lit qu'un utilisateur
+            reset_link = f"http://127.0.0.1:8000/authentification/reset-password/{make_reset_uid(user)}/{token}/"
+            queue_mail(
                 subject="Password Reset Request",
                 message=f"Click the link below to reset your password:\n\n{reset_link}",
                 from_email="admin@yourdomain.com",
@@ -57,36 +57,17 @@ class PasswordResetRequestSerializer(serializers.Serializer):
             raise serializers.ValidationError(f"An error occurred while sending the email: {str(e)}")
 
 class PasswordResetSerializer(serializers.Serializer):
+    uidb64 = serializers.CharField()
     token = serializers.CharField()
     new_password = serializers.CharField(write_only=True)
 
-    TOKEN_EXPIRATION_TIME = timedelta(minutes=3)  # Token expiration time
-
     def validate(self, attrs):
-        token = attrs.get("token")
-        try:
-            user = self.get_user_from_token(token)
-            attrs["user"] = user
-        except serializers.ValidationError as e:
-            raise serializers.ValidationError({"non_field_errors": e.detail})
-        except Exception as e:
-            raise serializers.ValidationError({"non_field_errors": [str(e)]})
+        user = get_user_for_reset(attrs["uidb64"], attrs["token"])
+        if user is None:
+            raise serializers.ValidationError({"non_field_errors": ["Invalid or expired token."]})
+        attrs["user"] = user
         return attrs
 
-    def get_user_from_token(self, token):
-        User = get_user_model()
-        for user in User.objects.all():
-            if default_token_generator.check_token(user, token):
-                if self.is_token_expired(user):
-                    raise serializers.ValidationError("Token has expired.")
-                return user
-        raise serializers.ValidationError("Invalid or expired token.")
-
-    def is_token_expired(self, user):
-        last_login = user.last_login or now()
-        token_creation_time = last_login
-        return now() > (token_creation_time + self.TOKEN_EXPIRATION_TIME)
-
     def save(self):
         user = self.validated_data['user']
         new_password = self.validated_data['new_password']
@@ -95,34 +76,37 @@ class PasswordResetSerializer(serializers.Serializer):
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
-    def get_token(cls, user):
+    def get_token(cls, user, groups=None):
         try:
-            token = RefreshToken.for_user(user)
-            token['groups'] = [group.name for group in user.groups.all()] if user.groups.exists() else []
-            token['email'] = user.email
-            logger.debug(f"Customized access token payload: {dict(token.access_token)}")
+            token = add_group_claims(RefreshToken.for_user(user), user, groups)
+            if logger.isEnabledFor(logging.DEBUG):  # Payload formaté seulement si le log est émis
+                logger.debug("Customized access token payload: %s", token.access_token.payload)
             return token
         except Exception as e:
             logger.error(f"Error in get_token: {str(e)}")
             raise
 
     def validate(self, attrs):
+        """
+        Connexion en un seul passage : authentification (TokenObtainSerializer, sans émission de jeton),
+        groupes et permissions en une requête, puis une seule paire de jetons.
+        """
         try:
-            logger.debug(f"Validating attrs: {attrs}")
-            data = super().validate(attrs)
-            if not hasattr(self, 'user') or self.user is None:
-                logger.error("User not set after validation")
-                raise ValueError("User not authenticated")
-            refresh = self.get_token(self.user)
+            logger.debug("Validating login for %s", attrs.get(self.username_field))
+            TokenObtainSerializer.validate(self, attrs)  # Définit self.user ou lève AuthenticationFailed
+            groups, permissions = load_groups_and_permissions(self.user)
+            refresh = self.get_token(self.user, groups)
+            if api_settings.UPDATE_LAST_LOGIN:
+                update_last_login(None, self.user)
             data = {
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
                 "email": self.user.email,
-                "groups": [group.name for group in self.user.groups.all()] if self.user.groups.exists() else [],
-                "permissions": list(self.user.get_all_permissions()),
+                "groups": groups,
+                "permissions": permissions,
             }
-            logger.debug(f"Response data: {data}")
+            logger.debug("Login succeeded for %s", self.user.email)
             return data
         except Exception as e:
             logger.error(f"Error in validate: {str(e)}")
-            raise
\ No newline at end of file
+            raise
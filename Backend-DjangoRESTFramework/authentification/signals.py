@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .blacklist import bump_blacklist_version
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted(sender, instance, created, **kwargs):
+    if created:
+        # Après le commit : les autres processus relisent la table une fois la ligne visible
+        transaction.on_commit(bump_blacklist_version)
@@ -1,3 +1,326 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import Group, Permission
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+from notifications.models import EmailJob
+from .authentication import ClaimsUser, StatelessJWTAuthentication, load_user, verify_token
+from . import blacklist
+from .blacklist import FilteredRefreshToken, blacklist_filter
+from .models import User
+from .roles import IsAdmin, IsSuperAdmin
+from .serializers import CustomTokenObtainPairSerializer, PasswordResetSerializer
+from .tokens import custom_token_generator, get_user_for_reset, make_reset_uid
 
-# Create your tests here.
+
+class RoleResolutionTests(TestCase):
+    """Les vérifications de rôle ne coûtent aucune requête au-delà de l'authentification."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='superadmin@example.com', password='secret')
+        cls.user.groups.add(Group.objects.create(name='superadmin'))
+
+    def authenticated_request(self, token):
+        request = Request(
+            APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}'),
+            authenticators=[JWTAuthentication()],
+        )
+        request.user  # Authentification (lecture du User) hors du périmètre mesuré
+        return request
+
+    def test_roles_from_jwt_claim_cost_no_query(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        request = self.authenticated_request(token)
+        with self.assertNumQueries(0):
+            self.assertTrue(IsSuperAdmin().has_permission(request, None))
+            self.assertFalse(IsAdmin().has_permission(request, None))
+
+    def test_login_view_token_carries_groups(self):
+        response = self.client.post(
+            '/authentification/users/login/',
+            {'email': 'superadmin@example.com', 'password': 'secret'},
+            content_type='application/json',
+        )
+        request = self.authenticated_request(response.json()['access'])
+        with self.assertNumQueries(0):
+            self.assertTrue(IsSuperAdmin().has_permission(request, None))
+
+    def test_roles_without_claim_are_loaded_once(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        del token['groups']
+        request = self.authenticated_request(token)
+        with self.assertNumQueries(1):
+            self.assertTrue(IsSuperAdmin().has_permission(request, None))
+            self.assertFalse(IsAdmin().has_permission(request, None))
+            self.assertTrue(IsSuperAdmin().has_permission(request, None))
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    """Authentification depuis les revendications du jeton, sans lecture de la table User."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='admin@example.com', password='secret', nom='Admin')
+        cls.user.groups.add(Group.objects.create(name='admin'))
+
+    def setUp(self):
+        verify_token.cache_clear()
+
+    def authenticate(self, token):
+        request = Request(
+            APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}'),
+            authenticators=[StatelessJWTAuthentication()],
+        )
+        return request.user
+
+    def test_user_from_claims_without_query(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+            self.assertIsInstance(user, ClaimsUser)
+            self.assertEqual(user.pk, str(self.user.pk))
+            self.assertEqual(user.email, 'admin@example.com')
+        self.assertEqual(load_user(user).nom, 'Admin')
+
+    def test_verified_tokens_are_cached_until_expiry(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.authenticate(token)
+        self.authenticate(token)
+        self.assertEqual(verify_token.cache_info().hits, 1)
+
+        # Jeton déjà vérifié (dans le LRU) mais expiré depuis
+        later = aware_utcnow() + timedelta(minutes=31)
+        with mock.patch('authentification.authentication.aware_utcnow', return_value=later):
+            with self.assertRaises(InvalidToken):
+                self.authenticate(token)
+
+
+class BlacklistFilterTests(TestCase):
+    """Le cas courant (jeton non blacklisté) ne touche pas à la table BlacklistedToken."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='user@example.com', password='secret')
+
+    def setUp(self):
+        blacklist_filter.bloom = None
+        blacklist_filter.version = None
+
+    def test_filter_skips_query_and_sees_new_blacklist(self):
+        refresh = FilteredRefreshToken.for_user(self.user)
+        refresh.check_blacklist()  # Construction du filtre
+        with self.assertNumQueries(0):
+            refresh.check_blacklist()
+
+        access = refresh.access_token
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/authentification/users/logout/', {'refresh': str(refresh)},
+                HTTP_AUTHORIZATION=f'Bearer {access}', content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            '/authentification/token/refresh/', {'refresh': str(refresh)}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_blacklist_from_another_process(self):
+        refresh = FilteredRefreshToken.for_user(self.user)
+        refresh.check_blacklist()
+        # Autre processus : ligne ajoutée et séquence incrémentée, sans les signaux de celui-ci
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=OutstandingToken.objects.get(jti=refresh['jti']))])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('jwt_blacklist_version_seq')")
+        refresh.check_blacklist()  # Dans le délai
+        with mock.patch.object(blacklist, 'BLACKLIST_VERSION_TTL', 0):
+            with self.assertRaises(TokenError):
+                refresh.check_blacklist()
+
+    def test_prune_tokens_removes_only_expired(self):
+        FilteredRefreshToken.for_user(self.user).blacklist()
+        expired = FilteredRefreshToken.for_user(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=aware_utcnow() - timedelta(days=1))
+
+        call_command('prune_tokens', batch_size=1, stdout=mock.Mock())
+        self.assertFalse(OutstandingToken.objects.filter(jti=expired['jti']).exists())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class PasswordResetTests(TestCase):
+    """Le lien de réinitialisation porte l'identifiant : une seule lecture, sans parcourir les utilisateurs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='reset@example.com', password='ancien')
+        User.objects.bulk_create(User(email=f'autre{i}@example.com') for i in range(50))
+
+    def test_reset_link_resolves_user_with_one_query(self):
+        response = self.client.post(
+            '/authentification/reset-password/request/', {'email': 'reset@example.com'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        link = EmailJob.objects.get().message.split()[-1]
+        uidb64, token = link.rstrip('/').split('/')[-2:]
+        self.assertEqual(self.client.get(link.split('8000', 1)[1]).status_code, 200)
+
+        serializer = PasswordResetSerializer(data={'uidb64': uidb64, 'token': token, 'new_password': 'nouveau'})
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        serializer.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('nouveau'))
+
+        # Jeton à usage unique : le mot de passe a changé
+        response = self.client.post(
+            '/authentification/reset-password/',
+            {'uidb64': uidb64, 'token': token, 'new_password': 'encore'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_expired_or_malformed_token_is_rejected(self):
+        uidb64 = make_reset_uid(self.user)
+        token = custom_token_generator.make_token(self.user)
+        later = custom_token_generator._now() + timedelta(minutes=4)
+        with mock.patch.object(custom_token_generator, '_now', return_value=later):
+            self.assertIsNone(get_user_for_reset(uidb64, token))
+        self.assertIsNone(get_user_for_reset('pas-un-uid', token))
+        self.assertEqual(get_user_for_reset(uidb64, token), self.user)
+
+
+class UserDirectoryTests(TestCase):
+    """L'annuaire coûte un nombre de requêtes constant, quel que soit le nombre d'utilisateurs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        superadmin, admin = Group.objects.create(name='superadmin'), Group.objects.create(name='admin')
+        cls.user = User.objects.create_user(email='chef@example.com', password='secret', nom='Chef')
+        cls.user.groups.add(superadmin)
+        for i in range(30):
+            user = User.objects.create(email=f'agent{i:02}@example.com', nom='Agent', prenom=f'N{i}')
+            if i % 2:
+                user.groups.add(admin)
+
+    def setUp(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    def test_list_in_constant_queries(self):
+        with self.assertNumQueries(1):
+            users = self.client.get('/authentification/users/affiche/').json()['users']
+        self.assertEqual(len(users), 31)
+        self.assertEqual(users[0]['email'], 'agent00@example.com')
+        self.assertEqual(users[0]['role'], 'No Role')
+        self.assertEqual(users[1]['role'], 'admin')
+
+        with self.assertNumQueries(2):  # COUNT + page
+            page = self.client.get('/authentification/users/affiche/?page=2&page_size=10').json()
+        self.assertEqual(page['count'], 31)
+        self.assertEqual([user['email'] for user in page['results']][0], 'agent10@example.com')
+
+    def test_search_and_role_filter(self):
+        response = self.client.get('/authentification/users/affiche/?role=admin&q=agent0')
+        self.assertEqual(
+            [user['email'] for user in response.json()['users']],
+            ['agent01@example.com', 'agent03@example.com', 'agent05@example.com',
+             'agent07@example.com', 'agent09@example.com'],
+        )
+        response = self.client.get('/authentification/users/affiche/?q=chef')
+        self.assertEqual([user['role'] for user in response.json()['users']], ['superadmin'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/authentification/users/affiche/{self.user.pk}/')
+        self.assertEqual(response.json()['user']['role'], 'superadmin')
+
+
+class LoginTests(TestCase):
+    """Une connexion émet une seule paire de jetons et lit groupes et permissions en une requête."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='login@example.com', password='secret')
+        admin = Group.objects.create(name='admin')
+        admin.permissions.add(Permission.objects.get(codename='view_group'))
+        cls.user.groups.add(admin, Group.objects.create(name='agent'))
+        cls.user.user_permissions.add(Permission.objects.get(codename='add_group'))
+
+    def test_single_pass_login(self):
+        with self.assertNumQueries(3):  # Utilisateur, groupes + permissions, OutstandingToken
+            response = self.client.post(
+                '/authentification/users/login/',
+                {'email': 'login@example.com', 'password': 'secret'},
+                content_type='application/json',
+            )
+        data = response.json()
+        self.assertEqual(data['groups'], ['admin', 'agent'])
+        self.assertEqual(data['permissions'], sorted(User.objects.get(pk=self.user.pk).get_all_permissions()))
+        self.assertEqual(OutstandingToken.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(verify_token(data['access'])['groups'], ['admin', 'agent'])
+
+    def test_wrong_password_is_rejected(self):
+        response = self.client.post(
+            '/authentification/token/',
+            {'email': 'login@example.com', 'password': 'faux'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class RequestProfilingTests(TestCase):
+    """Profil d'une requête à la demande d'un superadmin, SQL inclus, téléchargeable ensuite."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superadmin = User.objects.create_user(email='profil@example.com', password='secret')
+        cls.superadmin.groups.add(Group.objects.create(name='superadmin'))
+        cls.agent = User.objects.create_user(email='agent@example.com', password='secret')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_override = override_settings(PROFILE_DIR=directory.name)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def get(self, url, user, **extra):
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        return self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}', **extra)
+
+    def test_superadmin_profile_with_sql(self):
+        response = self.get('/authentification/users/affiche/', self.superadmin, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+
+        summary = self.get(f'/profiles/{profile_id}/', self.superadmin).json()
+        self.assertEqual(summary['path'], '/authentification/users/affiche/')
+        self.assertEqual(summary['sql_count'], 1)
+        self.assertIn('auth_group', summary['sql'][0]['sql'])
+        self.assertRegex(summary['stats'], r'authentification/views\.py:\d+\(get\)')  # GetUsersView.get
+        self.assertEqual([profile['id'] for profile in self.get('/profiles/', self.superadmin).json()], [profile_id])
+
+        download = self.get(f'/profiles/{profile_id}/download/', self.superadmin)
+        self.assertTrue(b''.join(download.streaming_content))
+
+    def test_flag_ignored_for_other_users(self):
+        response = self.get('/authentification/users/affiche/?profile=1', self.agent)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.get('/profiles/', self.agent).status_code, 403)
+
+    def test_flag_must_be_one(self):
+        for extra in ({'HTTP_X_PROFILE': '0'}, {'HTTP_X_PROFILE': ''}):
+            self.assertNotIn('X-Profile-Id', self.get('/authentification/users/affiche/', self.superadmin, **extra))
+        self.assertNotIn('X-Profile-Id', self.get('/authentification/users/affiche/?profile=0', self.superadmin))
+        self.assertIn('X-Profile-Id', self.get('/authentification/users/affiche/?profile=1', self.superadmin))
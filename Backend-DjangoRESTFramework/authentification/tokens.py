@@ -1,6 +1,8 @@
+from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from datetime import datetime, timedelta
-import time
+from django.core.exceptions import ValidationError
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import base36_to_int, urlsafe_base64_decode, urlsafe_base64_encode
 
 class CustomPasswordResetTokenGenerator(PasswordResetTokenGenerator):
     def _make_hash_value(self, user, timestamp):
@@ -18,7 +20,7 @@ class CustomPasswordResetTokenGenerator(PasswordResetTokenGenerator):
                 return False
 
             # Calculate the age of the token in minutes
-            token_age_minutes = (time.time() - token_timestamp) / 60
+            token_age_minutes = (self._num_seconds(self._now()) - token_timestamp) / 60
             if token_age_minutes > token_lifetime:
                 return False  # Token has expired
 
@@ -28,15 +30,34 @@ class CustomPasswordResetTokenGenerator(PasswordResetTokenGenerator):
 
     def _get_token_timestamp(self, token):
         """
-        Extract the timestamp from the token.
+        Extract the timestamp from the token ("<timestamp base36>-<hash>").
         """
         try:
             token_parts = token.split("-")
             if len(token_parts) < 2:
                 return None
-            return int(token_parts[1])  # The timestamp is stored in the second part of the token
+            return base36_to_int(token_parts[0])  # Seconds since 2001-01-01, like Django's generator
         except (ValueError, IndexError):
             return None
 
 # Create the custom token generator instance
 custom_token_generator = CustomPasswordResetTokenGenerator()
+
+
+def make_reset_uid(user):
+    return urlsafe_base64_encode(force_bytes(user.pk))
+
+
+def get_user_for_reset(uidb64, token):
+    """
+    Utilisateur désigné par le lien de réinitialisation (uidb64 + jeton), ou None.
+    Une seule lecture par clé primaire, quel que soit le nombre d'utilisateurs.
+    """
+    try:
+        uid = force_str(urlsafe_base64_decode(uidb64))
+        user = get_user_model().objects.get(pk=uid)
+    except (TypeError, ValueError, OverflowError, ValidationError, get_user_model().DoesNotExist):
+        return None
+    if custom_token_generator.check_token(user, token):
+        return user
+    return None
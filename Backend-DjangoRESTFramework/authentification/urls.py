@@ -12,7 +12,7 @@ urlpatterns = [
     path('authentification/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('authentification/reset-password/request/', PasswordResetRequestView.as_view(), name='reset_password_request'),
     path('authentification/reset-password/', PasswordResetView.as_view(), name='reset_password'),
-    path('reset-password/<token>/', PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
+    path('authentification/reset-password/<uidb64>/<token>/', PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
     path('authentification/users/logout/', LogoutView.as_view(), name='logout'),
     path('authentification/token/blacklist/', TokenBlacklistView.as_view(), name='token_blacklist'),
     path('authentification/users/delete/<str:pk>/', DeleteUserView.as_view(), name='delete_user'),
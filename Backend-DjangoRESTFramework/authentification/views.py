@@ -2,17 +2,19 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.core.mail import send_mail
+from notifications.mail import queue_mail
 from Projet_de_stage import settings
 from .serializers import UserSerializer,PasswordResetRequestSerializer,PasswordResetSerializer,CustomTokenObtainPairSerializer
 from .models import User
 from rest_framework import status
-from django.utils.http import urlsafe_base64_decode
-from django.contrib.auth import get_user_model
+from rest_framework.exceptions import APIException
 from django.http import HttpResponse
-from django.contrib.auth.tokens import default_token_generator
-from .tokens import custom_token_generator
+from .tokens import get_user_for_reset
+from .roles import SUPERADMIN, has_role
+from .authentication import load_user
+from .blacklist import FilteredRefreshToken
+from .directory import user_directory
+from .pagination import UserPagination
 from django.contrib.auth.models import Group
 from rest_framework_simplejwt.tokens import RefreshToken,AccessToken
 from rest_framework_simplejwt.exceptions import TokenError
@@ -26,27 +28,14 @@ class LoginView(TokenObtainPairView):
     """
     Customized Login View to include additional user details like groups and permissions.
     """
-    class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
-        def validate(self, attrs):
-            data = super().validate(attrs)
-            user = self.user
-
-            # Add user details
-            groups = [group.name for group in user.groups.all()]
-            permissions = list(user.get_all_permissions())
-
-            data.update({
-                "email": user.email,
-                "groups": groups,
-                "permissions": permissions,
-            })
-            return data
+    # Connexion en un seul passage : une paire de jetons, groupes et permissions en une requête
     serializer_class = CustomTokenObtainPairSerializer
 
 
 class GetUsersView(APIView):
     """
     Retrieve a single user by their pk (primary key) or all users with their email, role, name, surname, and phone number.
+    The list accepts ?q= (email/nom/prenom) and ?role=, and is paginated when ?page= or ?page_size= is given.
     Requires JWT token for authentication.
     """
     permission_classes = [IsAuthenticated]
@@ -54,41 +43,21 @@ class GetUsersView(APIView):
     def get(self, request, pk=None):
         try:
             if pk:
-                # Fetch the specific user by pk
-                user = User.objects.get(id=pk)
-                role = user.groups.first().name if user.groups.exists() else "No Role"
-
-                # Return user data
-                user_data = {
-                    "id": user.id,
-                    "email": user.email,
-                    "nom": user.nom,
-                    "prenom": user.prenom,
-                    "numero_telephone": user.numero_telephone,
-                    "role": role,
-                }
+                # Fetch the specific user by pk, role included (one query)
+                user_data = user_directory().get(id=pk)
                 return Response({"user": user_data}, status=status.HTTP_200_OK)
             else:
-                # Fetch all users
-                users = User.objects.all()
-
-                # Serialize user data
-                users_data = []
-                for user in users:
-                    role = user.groups.first().name if user.groups.exists() else "No Role"
-                    users_data.append({
-                        "id": user.id,
-                        "email": user.email,
-                        "nom": user.nom,
-                        "prenom": user.prenom,
-                        "numero_telephone": user.numero_telephone,
-                        "role": role,
-                    })
-
-                return Response({"users": users_data}, status=status.HTTP_200_OK)
+                users = user_directory(request.query_params)
+                paginator = UserPagination()
+                if paginator.is_requested(request):  # Mode paginé (?page= / ?page_size=)
+                    page = paginator.paginate_queryset(users, request, view=self)
+                    return paginator.get_paginated_response(page)
+                return Response({"users": list(users)}, status=status.HTTP_200_OK)
 
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        except APIException:
+            raise  # Page invalide (404) : réponse standard de DRF
         except Exception as e:
             return Response(
                 {"error": f"An error occurred while retrieving users: {str(e)}"},
@@ -110,7 +79,7 @@ class RegisterView(APIView):
         return []
 
     def get(self, request):
-        user = request.user
+        user = load_user(request.user)
         serializer = UserSerializer(user)
         return Response({
             "user_details": serializer.data,
@@ -119,7 +88,7 @@ class RegisterView(APIView):
     
     def post(self, request):
         # Check if the user is authenticated and has the superadmin role
-        if not request.user.groups.filter(name='superadmin').exists():
+        if not has_role(request, SUPERADMIN):
             return Response({'error': 'Permission denied. Only superadmin can register users.'}, status=status.HTTP_403_FORBIDDEN)
 
         # Retrieve the data from the request
@@ -168,15 +137,15 @@ class RegisterView(APIView):
                     "Pour des raisons de sécurité, nous vous recommandons de changer votre mot de passe après votre première connexion.\n\n"
                     "Cordialement,\nL'équipe de la plateforme"
                 )
-                send_mail(
+                queue_mail(
                     subject="Bienvenue dans notre plateforme",
                     message=user_message,
                     from_email='malekhichri2003@gmail.com',
                     recipient_list=[email],
                 )
-                logger.info(f"Welcome email sent successfully to {email}")
+                logger.info(f"Welcome email queued for {email}")
             except Exception as e:
-                logger.error(f"Failed to send welcome email to {email}: {str(e)}")
+                logger.error(f"Failed to queue welcome email to {email}: {str(e)}")
                 return Response({
                     "message": "User created successfully, but failed to send welcome email.",
                     "error": str(e),
@@ -191,7 +160,7 @@ class RegisterView(APIView):
                 }, status=status.HTTP_201_CREATED)
 
             return Response({
-                "message": "User created successfully. Welcome email sent.",
+                "message": "User created successfully. Welcome email queued.",
                 "user": {
                     "email": user.email,
                     "role": role,
@@ -217,7 +186,7 @@ class LogoutView(APIView):
                 )
 
             # Blacklist the refresh token
-            refresh = RefreshToken(refresh_token)
+            refresh = FilteredRefreshToken(refresh_token)
 
             try:
                 refresh.blacklist()
@@ -292,15 +261,8 @@ class PasswordResetView(APIView):
 
 class PasswordResetConfirmView(APIView):
     def get(self, request, uidb64, token):
-        try:
-            # Decode the UID and fetch the user
-            uid = urlsafe_base64_decode(uidb64).decode()
-            user = get_user_model().objects.get(id=uid)
-        except Exception:
-            return HttpResponse("Invalid link or expired.")
-
-        # Use the custom token generator to validate the token
-        if custom_token_generator.check_token(user, token):
+        # Decode the UID, fetch the user and validate the token with the custom token generator
+        if get_user_for_reset(uidb64, token) is not None:
             return Response({"message": "Valid token, reset your password."})
         else:
             return HttpResponse("Invalid token or expired.")
@@ -309,7 +271,7 @@ class DeleteUserView(APIView):
     permission_classes = [IsAuthenticated]  
 
     def delete(self, request, pk):
-        if not request.user.groups.filter(name='superadmin').exists():
+        if not has_role(request, SUPERADMIN):
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         try:
             user = User.objects.get(pk=pk)
@@ -325,7 +287,7 @@ class ModifyUserView(APIView):
 
     def put(self, request, pk):
         # Vérifier si l'utilisateur est superadmin
-        if not request.user.groups.filter(name='superadmin').exists():
+        if not has_role(request, SUPERADMIN):
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
         try:
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import mimetypes
+import re
+from io import BytesIO
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_etags
+from PIL import Image, ImageOps
+from .models import AttachmentBlob
+
+logger = logging.getLogger(__name__)
+
+# Nom de la variante -> taille maximale (pixels)
+VARIANTS = {
+    'thumbnail': (320, 320),
+    'web': (1600, 1600),
+}
+VARIANT_FORMAT = 'WEBP'
+VARIANT_QUALITY = 80
+READ_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+URL_TOKEN_SALT = 'demande.piece_jointe'
+
+
+def url_token(demande_id, variant=None):
+    """
+    Jeton signé (horodaté) d'une URL de pièce jointe : un <img src> ne peut pas envoyer
+    l'en-tête Authorization. Ne vaut que pour cette demande et cette variante.
+    """
+    value = f'{demande_id}:{variant or ""}'
+    return signing.TimestampSigner(salt=URL_TOKEN_SALT).sign(value)[len(value) + 1:]
+
+
+def check_url_token(token, demande_id, variant=None):
+    """Jeton valide et de moins de DEMANDE_ATTACHMENT_URL_MAX_AGE secondes."""
+    if not token:
+        return False
+    value = f'{demande_id}:{variant or ""}'
+    try:
+        signing.TimestampSigner(salt=URL_TOKEN_SALT).unsign(
+            f'{value}:{token}', max_age=getattr(settings, 'DEMANDE_ATTACHMENT_URL_MAX_AGE', 3600),
+        )
+    except signing.BadSignature:  # Y compris SignatureExpired
+        return False
+    return True
+
+
+def variant_name(blob, variant):
+    return f'pieces_jointes/variants/{blob.sha256[:2]}/{blob.sha256}-{variant}.webp'
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail(size, Image.Resampling.LANCZOS)  # Jamais agrandie, proportions conservées
+    output = BytesIO()
+    variant.save(output, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+    return output.getvalue()
+
+
+def generate_variants(batch_size=10):
+    """
+    Réclame jusqu'à batch_size images en attente (SKIP LOCKED, comme send_queued_mail)
+    et enregistre leur miniature et leur version web. Retourne le nombre d'images traitées.
+    """
+    with transaction.atomic():
+        blobs = list(
+            AttachmentBlob.objects.select_for_update(skip_locked=True)
+            .filter(variants_status='pending')
+            .order_by('created_at')[:batch_size]
+        )
+        for blob in blobs:
+            try:
+                with blob.file.open('rb') as source, Image.open(source) as image:
+                    image = ImageOps.exif_transpose(image)  # Photos de téléphone : orientation EXIF appliquée
+                    if image.mode not in ('RGB', 'RGBA'):
+                        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+                    for variant, size in VARIANTS.items():
+                        name = variant_name(blob, variant)
+                        if default_storage.exists(name):
+                            default_storage.delete(name)
+                        setattr(blob, variant, default_storage.save(name, ContentFile(render_variant(image, size))))
+                blob.variants_status = 'done'
+            except Exception as e:  # Image illisible ou trop grande : l'original reste servi
+                logger.warning(f"Attachment variants failed for {blob.sha256}: {e}")
+                blob.variants_status = 'failed'
+            blob.save(update_fields=['variants_status', 'thumbnail', 'web'])
+    return len(blobs)
+
+
+def attachment_file(piece_jointe, variant=None):
+    """
+    (nom dans le stockage, ETag, type MIME, taille) de la pièce jointe, ou de sa variante
+    si elle est prête. Les contenus dédupliqués ont pour ETag leur empreinte SHA-256.
+    """
+    blob = AttachmentBlob.objects.filter(file=piece_jointe.name).first()
+    if blob is None:  # Fichier envoyé avant le stockage par empreinte
+        storage = piece_jointe.storage
+        size = storage.size(piece_jointe.name)
+        modified = storage.get_modified_time(piece_jointe.name).timestamp()
+        etag = hashlib.md5(f'{piece_jointe.name}:{size}:{modified}'.encode()).hexdigest()
+        content_type = mimetypes.guess_type(piece_jointe.name)[0] or 'application/octet-stream'
+        return piece_jointe.name, f'"{etag}"', content_type, size
+    if variant and blob.variants_status == 'done':
+        name = getattr(blob, variant).name
+        return name, f'"{blob.sha256}-{variant}"', 'image/webp', default_storage.size(name)
+    return blob.file.name, f'"{blob.sha256}"', blob.content_type, blob.size
+
+
+def parse_range(header, size):
+    """
+    Plage unique "bytes=début-fin" -> (début, fin incluse) ; None si absente ou invalide (fichier
+    complet, RFC 9110 : un début après la fin est ignoré), False si elle commence après le fichier.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':  # Suffixe : les N derniers octets
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        if end and int(start) > int(end):
+            return None
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size:
+        return False
+    return start, end
+
+
+def iter_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve_attachment(request, name, etag, content_type, size, filename):
+    """
+    Réponse de téléchargement avec revalidation (If-None-Match -> 304) et plages (Range -> 206).
+    Avec DEMANDE_SENDFILE_HEADER (ex. X-Accel-Redirect), l'envoi du fichier est délégué au
+    serveur web ; sinon FileResponse laisse le serveur WSGI utiliser wsgi.file_wrapper (sendfile).
+    """
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'private, no-cache',
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': content_disposition_header(False, filename),
+    }
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return HttpResponse(status=304, headers=headers)
+
+    sendfile_header = getattr(settings, 'DEMANDE_SENDFILE_HEADER', None)
+    if sendfile_header:  # Le serveur web gère lui-même Range et l'envoi sans copie
+        headers[sendfile_header] = settings.DEMANDE_SENDFILE_PREFIX + name
+        return HttpResponse(content_type=content_type, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == etag:  # If-Range périmé : fichier complet
+        byte_range = parse_range(request.headers.get('Range'), size)
+    if byte_range is False:
+        return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_range(default_storage.open(name, 'rb'), start, end - start + 1),
+            status=206, content_type=content_type, headers=headers,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+        return response
+
+    return FileResponse(default_storage.open(name, 'rb'), content_type=content_type, filename=filename, headers=headers)
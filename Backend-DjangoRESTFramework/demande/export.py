@@ -0,0 +1,52 @@
+import csv
+import json
+from .serializers import DemandeListSerializer
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+CSV_COLUMNS = [
+    'id', 'key', 'titre', 'description', 'nom_complet', 'email', 'telephone', 'adresse',
+    'request_type', 'domaine', 'statut', 'municipalite_id', 'municipalite', 'piece_jointe',
+    'created_at', 'updated_at', 'treated_at',
+]
+
+
+class Echo:
+    """Pseudo-fichier : csv.writer écrit une ligne, on la renvoie telle quelle."""
+    def write(self, value):
+        return value
+
+
+def iter_demandes(queryset, chunk_size=2000):
+    """
+    Parcourt les demandes avec un curseur côté serveur (.iterator), par paquets
+    de chunk_size lignes : la mémoire reste constante quelle que soit la taille de la table.
+    """
+    serializer = DemandeListSerializer(None)
+    rows = DemandeListSerializer.get_queryset(queryset).order_by('id')
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(row)
+
+
+def ndjson_lines(demandes):
+    for demande in demandes:
+        yield json.dumps(demande, ensure_ascii=False) + '\n'
+
+
+def csv_lines(demandes):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for demande in demandes:
+        municipalite = demande['municipalite']
+        row = dict(demande, municipalite_id=municipalite['id'], municipalite=municipalite['name_francais'])
+        yield writer.writerow([row[column] for column in CSV_COLUMNS])
+
+
+def export_lines(queryset, export_format, chunk_size=2000):
+    demandes = iter_demandes(queryset, chunk_size=chunk_size)
+    if export_format == 'csv':
+        return csv_lines(demandes)
+    return ndjson_lines(demandes)
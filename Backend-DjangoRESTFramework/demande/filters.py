@@ -0,0 +1,68 @@
+import unicodedata
+import uuid
+from datetime import datetime, time
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from .models import Demande, SEARCH_CONFIG
+
+
+def filter_demandes(queryset, params):
+    """
+    Applique les filtres statut, domaine, request_type et municipalite
+    (id ou name_francais) passés en query params.
+    """
+    choices = {
+        'statut': Demande.STATUT_CHOICES,
+        'domaine': Demande.DOMAINE_CHOICES,
+        'request_type': Demande.REQUETE_CHOICES,
+    }
+    for field, field_choices in choices.items():
+        value = params.get(field)
+        if value:
+            if value not in dict(field_choices):
+                raise serializers.ValidationError({field: f"Invalid {field} choice."})
+            queryset = queryset.filter(**{field: value})
+
+    municipalite = params.get('municipalite')
+    if municipalite:
+        try:
+            queryset = queryset.filter(municipalite_id=uuid.UUID(municipalite))
+        except ValueError:
+            queryset = queryset.filter(municipalite__name_francais=municipalite)
+    return queryset
+
+
+def search_demandes(queryset, text):
+    """
+    Recherche plein texte sur titre et description (index GIN sur search_vector),
+    annotée par pertinence. Le texte est replié (accents, voyelles arabes) comme à l'indexation.
+    """
+    folded = ''.join(
+        char for char in unicodedata.normalize('NFKD', text)
+        if unicodedata.category(char) != 'Mn'
+    )
+    query = SearchQuery(folded, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', 'id')
+    )
+
+
+def parse_date_param(value):
+    """Date ou date-heure ISO -> datetime aware (minuit pour une date seule), None si invalide."""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            if date is None:
+                return None
+            parsed = datetime.combine(date, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
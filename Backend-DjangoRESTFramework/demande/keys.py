@@ -0,0 +1,92 @@
+import hashlib
+import string
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection
+
+KEY_LENGTH = 6
+KEY_ALPHABET = string.digits + string.ascii_uppercase
+HALF_SPACE = len(KEY_ALPHABET) ** (KEY_LENGTH // 2)  # 36^3 : une moitié de clé
+KEY_SPACE = HALF_SPACE ** 2  # 36^6 clés possibles
+KEY_SEQUENCE = 'demande_key_seq'  # Créée par la migration 0010
+ROUNDS = 4
+
+# Les 36^3 combinaisons de 3 caractères, dans l'ordre : index -> texte
+HALVES = [a + b + c for a in KEY_ALPHABET for b in KEY_ALPHABET for c in KEY_ALPHABET]
+HALF_INDEX = {half: index for index, half in enumerate(HALVES)}
+
+
+@lru_cache(maxsize=None)
+def round_tables(secret):
+    """Fonctions de tour du réseau de Feistel, précalculées : une table de 36^3 valeurs par tour."""
+    key = hashlib.sha256(f'demande.keys:{secret}'.encode()).digest()
+    return tuple(
+        [
+            int.from_bytes(hashlib.blake2b(f'{round_number}:{value}'.encode(), key=key, digest_size=8).digest(), 'big') % HALF_SPACE
+            for value in range(HALF_SPACE)
+        ]
+        for round_number in range(ROUNDS)
+    )
+
+
+def get_round_tables():
+    # Ne jamais changer ce secret après la mise en production : les clés déjà attribuées pourraient être réattribuées
+    return round_tables(settings.DEMANDE_KEY_SECRET)
+
+
+def encode_key(index, tables=None):
+    """
+    Numéro de séquence -> clé de 6 caractères. Permutation de [0, 36^6) par un réseau de Feistel
+    à clé secrète sur les deux moitiés de 3 caractères : deux numéros distincts donnent toujours
+    deux clés distinctes, et les clés successives ne se déduisent pas l'une de l'autre.
+    """
+    left, right = divmod(index, HALF_SPACE)
+    for table in tables or get_round_tables():
+        left, right = right, (left + table[right]) % HALF_SPACE
+    return HALVES[left] + HALVES[right]
+
+
+def decode_key(key, tables=None):
+    """Inverse de encode_key : clé -> numéro de séquence."""
+    left, right = HALF_INDEX[key[:3]], HALF_INDEX[key[3:]]
+    for table in reversed(tables or get_round_tables()):
+        left, right = (right - table[left]) % HALF_SPACE, left
+    return left * HALF_SPACE + right
+
+
+@lru_cache(maxsize=1)
+def reserved_keys():
+    """Clés attribuées avant l'allocateur (voir ReservedKey), chargées une fois par processus."""
+    from .models import ReservedKey
+    return frozenset(ReservedKey.objects.values_list('key', flat=True))
+
+
+def allocate_keys(count):
+    """
+    Attribue count clés uniques : une seule requête nextval() pour tout le lot,
+    sans vérification d'unicité ligne par ligne. Utilisable avant un bulk_create.
+    """
+    keys = []
+    tables = get_round_tables()
+    reserved = reserved_keys()
+    while len(keys) < count:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(%s) FROM generate_series(1, %s)',
+                [KEY_SEQUENCE, count - len(keys)],
+            )
+            indexes = [row[0] for row in cursor.fetchall()]
+        keys.extend(key for key in (encode_key(index, tables) for index in indexes) if key not in reserved)
+    return keys
+
+
+def allocate_key():
+    return allocate_keys(1)[0]
+
+
+def assign_keys(demandes):
+    """Attribue une clé aux demandes qui n'en ont pas (avant Demande.objects.bulk_create)."""
+    missing = [demande for demande in demandes if not demande.key]
+    for demande, key in zip(missing, allocate_keys(len(missing))):
+        demande.key = key
+    return demandes
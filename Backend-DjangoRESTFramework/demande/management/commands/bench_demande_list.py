@@ -0,0 +1,63 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from demande.models import Municipalite, Demande
+from demande.serializers import DemandeSerializer, DemandeListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare DemandeSerializer et DemandeListSerializer (requêtes et lignes/seconde)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000', help='Nombres de demandes à tester, séparés par des virgules')
+        parser.add_argument('--municipalites', type=int, default=50)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        self.stdout.write(f"{'rows':>8} {'path':<22} {'queries':>8} {'seconds':>9} {'rows/s':>10}")
+        for size in sizes:
+            # Les données de test sont créées puis annulées dans une transaction
+            with transaction.atomic():
+                self.seed(size, options['municipalites'])
+                self.measure(size, 'DemandeSerializer', lambda: DemandeSerializer(Demande.objects.all(), many=True).data)
+                self.measure(size, 'DemandeListSerializer',
+                             lambda: DemandeListSerializer(DemandeListSerializer.get_queryset(Demande.objects.all())).data)
+                transaction.set_rollback(True)
+
+    def seed(self, size, nb_municipalites):
+        municipalites = Municipalite.objects.bulk_create(
+            [Municipalite(name_francais=f'Bench {i}') for i in range(nb_municipalites)]
+        )
+        Demande.objects.bulk_create(
+            [
+                Demande(
+                    nom_complet=f'Citoyen {i}',
+                    email=f'citoyen{i}@example.com',
+                    telephone='12345678',
+                    adresse='Avenue Habib Bourguiba, Tunis',
+                    request_type='Reclamation',
+                    domaine='Transport',
+                    municipalite=municipalites[i % nb_municipalites],
+                    titre=f'Demande {i}',
+                    description='Description de test.',
+                    key=f'{i:06X}',
+                )
+                for i in range(size)
+            ],
+            batch_size=5000,
+        )
+
+    def measure(self, size, label, serialize):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            start = time.perf_counter()
+            rows = serialize()
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{size:>8} {label:<22} {len(queries):>8} {elapsed:>9.3f} {len(rows) / elapsed:>10.0f}"
+        )
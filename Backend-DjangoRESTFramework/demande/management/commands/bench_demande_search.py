@@ -0,0 +1,72 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from demande.models import Municipalite, Demande
+from demande.filters import search_demandes
+
+WORDS = [
+    'route', 'éclairage', 'lampadaire', 'école', 'hôpital', 'trottoir', 'déchets', 'eau', 'coupure',
+    'bruit', 'parc', 'transport', 'bus', 'retard', 'propriété', 'fuite', 'égout', 'nids', 'poule',
+    'panne', 'quartier', 'rue', 'avenue', 'marché', 'stationnement', 'الطريق', 'الإنارة', 'المدرسة',
+    'الماء', 'النفايات', 'الحديقة', 'الشارع', 'انقطاع', 'تسرب',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare la recherche plein texte (GIN) et ILIKE sur titre/description'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--terms', default='éclairage,fuite,المدرسة,stationnement')
+
+    def handle(self, *args, **options):
+        terms = options['terms'].split(',')
+        # Les données de test sont créées puis annulées dans une transaction
+        with transaction.atomic():
+            self.seed(options['rows'])
+            self.stdout.write(f"{'term':<16} {'path':<8} {'matches':>9} {'count ms':>9} {'top20 ms':>9}")
+            for term in terms:
+                ilike = Demande.objects.filter(Q(titre__icontains=term) | Q(description__icontains=term))
+                self.measure(term, 'ILIKE', ilike, options['repeat'])
+                self.measure(term, 'FTS', search_demandes(Demande.objects.all(), term), options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        municipalite = Municipalite.objects.create(name_francais='Bench')
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Demande._meta.db_table}
+                    (id, nom_complet, email, telephone, adresse, request_type, domaine, municipalite_id,
+                     titre, description, key, statut, created_at, updated_at)
+                SELECT gen_random_uuid(), 'Citoyen ' || i, 'citoyen' || i || '@example.com', '12345678',
+                       'Tunis', 'Reclamation', 'Autre', %(municipalite)s,
+                       CASE WHEN i %% 50 = 0 THEN w[1 + (i / 50) %% n] ELSE 'Signalement' END || ' numéro ' || i,
+                       CASE WHEN i %% 40 = 0 THEN w[1 + (i / 40 * 7) %% n] ELSE 'Problème constaté' END
+                           || ' dans le quartier, merci de traiter la demande ' || i,
+                       upper(lpad(to_hex(i), 6, '0')), 'non traité', now(), now()
+                FROM generate_series(1, %(rows)s) AS i,
+                     (SELECT %(words)s::text[] AS w, cardinality(%(words)s::text[]) AS n) AS vocabulary
+                """,
+                {'municipalite': municipalite.pk, 'rows': rows, 'words': WORDS},
+            )
+            cursor.execute(f'ANALYZE {Demande._meta.db_table}')
+        self.stdout.write(f'{rows} demandes insérées en {time.perf_counter() - start:.1f}s')
+
+    def measure(self, term, label, queryset, repeat):
+        count_times, top_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            matches = queryset.count()
+            count_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            list(queryset.values_list('id', flat=True)[:20])
+            top_times.append(time.perf_counter() - start)
+        self.stdout.write(
+            f"{term:<16} {label:<8} {matches:>9} "
+            f"{statistics.median(count_times) * 1000:>9.1f} {statistics.median(top_times) * 1000:>9.1f}"
+        )
@@ -0,0 +1,55 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment
+from rest_framework.test import APIClient
+from demande.models import Municipalite
+
+
+class Command(BaseCommand):
+    help = 'Mesure le débit de soumission de demandes (POST demandes/) et le nombre de requêtes SQL par soumission'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--municipalites', type=int, default=350)
+        parser.add_argument('--submissions', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()  # Client de test : hôte 'testserver' autorisé
+        client = APIClient()
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        # Les données de test sont créées puis annulées dans une transaction
+        with transaction.atomic():
+            names = [f'Municipalité {i}' for i in range(options['municipalites'])]
+            Municipalite.objects.bulk_create([Municipalite(name_francais=name) for name in names])
+            payloads = [
+                {
+                    'nom_complet': f'Citoyen {i}', 'email': f'citoyen{i}@example.com', 'telephone': '12345678',
+                    'adresse': 'Tunis', 'request_type': 'Reclamation', 'domaine': 'Autre',
+                    'municipalite': random.choice(names), 'titre': f'Demande {i}', 'description': 'Description',
+                }
+                for i in range(options['submissions'])
+            ]
+            client.post('/demandes/', payloads[0], format='json')  # Préchauffage (index des noms, caches)
+
+            start = time.perf_counter()
+            with connection.execute_wrapper(count_queries):
+                for payload in payloads:
+                    response = client.post('/demandes/', payload, format='json')
+                    if response.status_code != 201:
+                        self.stderr.write(f'{response.status_code} {response.content[:200]}')
+                        break
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        municipalite_queries = sum(1 for sql in queries if 'demande_municipalite' in sql and sql.startswith('SELECT'))
+        self.stdout.write(
+            f"{len(payloads)} soumissions en {elapsed:.2f}s : {len(payloads) / elapsed:.0f} soumissions/s, "
+            f"{len(queries) / len(payloads):.1f} requêtes/soumission "
+            f"(dont {municipalite_queries / len(payloads):.1f} lectures de municipalité)"
+        )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+from demande.models import Demande
+from demande.filters import filter_demandes
+from demande.export import EXPORT_FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Exporte les demandes en NDJSON ou CSV, en flux (mémoire constante)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=list(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--file', help='Fichier de sortie (par défaut : sortie standard)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--statut')
+        parser.add_argument('--domaine')
+        parser.add_argument('--request-type', dest='request_type')
+        parser.add_argument('--municipalite', help='Id ou nom de la municipalité')
+
+    def handle(self, *args, **options):
+        params = {
+            field: options[field]
+            for field in ('statut', 'domaine', 'request_type', 'municipalite')
+            if options[field]
+        }
+        try:
+            demandes = filter_demandes(Demande.objects.all(), params)
+        except serializers.ValidationError as e:
+            raise CommandError(e.detail)
+
+        lines = export_lines(demandes, options['output'], chunk_size=options['chunk_size'])
+        if options['file']:
+            with open(options['file'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+            self.stderr.write(self.style.SUCCESS(f"Export écrit dans {options['file']}"))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from demande.attachments import generate_variants
+
+
+class Command(BaseCommand):
+    help = "Worker de génération des miniatures et versions web des pièces jointes images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=5.0, help='Pause (secondes) quand la file est vide')
+        parser.add_argument('--once', action='store_true', help='Vide la file puis s\'arrête')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = generate_variants(batch_size=options['batch_size'])
+            if processed:
+                self.stdout.write(f'{processed} image(s) traitée(s)')
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['sleep'])
@@ -0,0 +1,151 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from demande.filters import parse_date_param
+from demande.keys import assign_keys
+from demande.models import Demande, DemandeCounter, ImportCheckpoint, Municipalite
+from demande.stats import invalidate_stats
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+TEXT_FIELDS = ['nom_complet', 'email', 'telephone', 'adresse', 'request_type', 'domaine', 'titre', 'description', 'statut']
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe des demandes depuis un fichier CSV ou NDJSON (même colonnes que export_demandes), "
+        "par lots bulk_create. L'avancement est enregistré en base à chaque lot : "
+        "relancer la même commande reprend après le dernier lot validé."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file')
+        parser.add_argument('--input', choices=IMPORT_FORMATS, help="Format (par défaut : d'après l'extension)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--name', help="Nom du point de reprise (par défaut : nom du fichier)")
+        parser.add_argument('--restart', action='store_true', help="Ignore le point de reprise existant")
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f"Fichier introuvable : {path}")
+        input_format = options['input'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size doit être positif")
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(name=options['name'] or os.path.basename(path))
+        if options['restart']:
+            checkpoint.position = checkpoint.imported = checkpoint.rejected = 0
+            checkpoint.save()
+        if checkpoint.position:
+            self.stdout.write(f"Reprise après {checkpoint.position} enregistrements")
+
+        # Nom (insensible à la casse) ou id -> id : aucune requête par ligne
+        self.municipalites = {}
+        for municipalite_id, name in Municipalite.objects.values_list('id', 'name_francais'):
+            self.municipalites[name.strip().casefold()] = municipalite_id
+            self.municipalites[str(municipalite_id)] = municipalite_id
+
+        start = time.perf_counter()
+        imported_now = 0
+        batch, position = [], checkpoint.position
+        with open(path, encoding='utf-8-sig', newline='') as source:
+            for line_number, record in self.read_records(source, input_format, checkpoint.position):
+                position += 1
+                try:
+                    batch.append(self.build_demande(record))
+                except ValidationError as e:
+                    checkpoint.rejected += 1
+                    self.stderr.write(f"Enregistrement {line_number} rejeté : {'; '.join(e.messages)}")
+                if len(batch) >= batch_size:
+                    imported_now += self.flush(batch, checkpoint, position)
+                    batch = []
+                    self.progress(checkpoint, imported_now, start)
+            if batch or position != checkpoint.position:
+                imported_now += self.flush(batch, checkpoint, position)
+        invalidate_stats()
+
+        self.progress(checkpoint, imported_now, start)
+        self.stdout.write(self.style.SUCCESS(
+            f"Import terminé : {checkpoint.imported} demandes importées, {checkpoint.rejected} rejetées"
+        ))
+
+    def read_records(self, source, input_format, skip):
+        """(numéro d'enregistrement, dict) en flux, en sautant les skip premiers."""
+        records = csv.DictReader(source) if input_format == 'csv' else self.read_ndjson(source)
+        for number, record in enumerate(records, start=1):
+            if number > skip:
+                yield number, record
+
+    def read_ndjson(self, source):
+        """Une ligne illisible devient une ValidationError, rejetée comme les autres : l'import continue."""
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValidationError(f"ligne {line_number} : JSON invalide ({e})")
+
+    def build_demande(self, record):
+        if isinstance(record, ValidationError):
+            raise record
+        if not isinstance(record, dict):
+            raise ValidationError(f"objet JSON attendu, reçu {type(record).__name__}")
+        errors = []
+        values = {field: str(record.get(field) or '').strip() for field in TEXT_FIELDS}
+        values['statut'] = values['statut'] or 'non traité'
+
+        municipalite = record.get('municipalite') or record.get('municipalite_id') or ''
+        if isinstance(municipalite, dict):  # Format de export_demandes en NDJSON
+            municipalite = municipalite.get('id') or municipalite.get('name_francais') or ''
+        municipalite_id = self.municipalites.get(str(municipalite).strip().casefold())
+        if municipalite_id is None:
+            errors.append(f"municipalité inconnue '{municipalite}'")
+
+        for field in ('created_at', 'treated_at'):
+            value = record.get(field)
+            if value:
+                values[field] = parse_date_param(value)
+                if values[field] is None:
+                    errors.append(f"{field} invalide '{value}'")
+        if values['statut'] == 'traité' and 'treated_at' not in values:
+            values['treated_at'] = values.get('created_at')
+        elif values['statut'] != 'traité':
+            values.pop('treated_at', None)
+
+        demande = Demande(municipalite_id=municipalite_id, **values)
+        try:
+            # Validation des champs sans requête (la municipalité est déjà résolue)
+            demande.clean_fields(exclude=['id', 'key', 'municipalite', 'piece_jointe', 'search_vector'])
+        except ValidationError as e:
+            errors.extend(f"{field} : {' '.join(messages)}" for field, messages in e.message_dict.items())
+        if errors:
+            raise ValidationError(errors)
+        return demande
+
+    def flush(self, batch, checkpoint, position):
+        """Insère le lot, met à jour les compteurs et le point de reprise dans une seule transaction."""
+        assign_keys(batch)  # Une requête nextval() pour tout le lot, sans collision possible
+        with transaction.atomic():
+            Demande.objects.bulk_create(batch)
+            # bulk_create n'émet pas les signaux : compteurs mis à jour par bucket
+            for bucket, count in Counter(DemandeCounter.bucket_of(demande) for demande in batch).items():
+                DemandeCounter.add(bucket, count)
+            checkpoint.position = position
+            checkpoint.imported += len(batch)
+            checkpoint.save()
+        return len(batch)
+
+    def progress(self, checkpoint, imported_now, start):
+        elapsed = time.perf_counter() - start
+        rate = imported_now / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{checkpoint.position} enregistrements lus, {checkpoint.imported} importés, "
+            f"{checkpoint.rejected} rejetés ({rate:.0f} demandes/s)"
+        )
@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from demande.models import AttachmentUpload
+from demande.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = "Supprime les envois par morceaux abandonnés (non terminés depuis --hours heures)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        uploads = AttachmentUpload.objects.filter(status='pending', updated_at__lt=cutoff)
+        count = 0
+        for upload in uploads.iterator():
+            discard_upload(upload)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"{count} envois abandonnés supprimés"))
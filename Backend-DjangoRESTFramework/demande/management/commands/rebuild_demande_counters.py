@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from demande.models import Demande, DemandeCounter
+from demande.stats import invalidate_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalcule (ou vérifie avec --verify) la table DemandeCounter à partir des demandes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Compare seulement, sans rien modifier')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Bloque les écritures sur les demandes (pas les lectures) pendant le calcul
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LOCK TABLE {Demande._meta.db_table} IN SHARE MODE')
+
+            expected = {
+                tuple(row[field] for field in DemandeCounter.BUCKET_FIELDS): row['count']
+                for row in Demande.objects.order_by().values(*DemandeCounter.BUCKET_FIELDS).annotate(count=Count('id'))
+            }
+            actual = {
+                tuple(row[:-1]): row[-1]
+                for row in DemandeCounter.objects.filter(count__gt=0).values_list(*DemandeCounter.BUCKET_FIELDS, 'count')
+            }
+            mismatches = {
+                bucket: (actual.get(bucket, 0), expected.get(bucket, 0))
+                for bucket in expected.keys() | actual.keys()
+                if actual.get(bucket, 0) != expected.get(bucket, 0)
+            }
+
+            if options['verify']:
+                for bucket, (found, count) in sorted(mismatches.items(), key=str):
+                    self.stdout.write(self.style.ERROR(f'{bucket}: compteur {found}, attendu {count}'))
+                if mismatches:
+                    raise CommandError(f'{len(mismatches)} compteur(s) incorrect(s).')
+                self.stdout.write(self.style.SUCCESS(f'{len(expected)} compteur(s) vérifié(s), aucun écart.'))
+                return
+
+            DemandeCounter.objects.all().delete()
+            DemandeCounter.objects.bulk_create(
+                [DemandeCounter(count=count, **dict(zip(DemandeCounter.BUCKET_FIELDS, bucket))) for bucket, count in expected.items()],
+                batch_size=1000,
+            )
+        invalidate_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(expected)} compteur(s) reconstruit(s), {len(mismatches)} écart(s) corrigé(s).'
+        ))
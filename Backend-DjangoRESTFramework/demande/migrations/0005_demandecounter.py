@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Demande = apps.get_model('demande', 'Demande')
+    DemandeCounter = apps.get_model('demande', 'DemandeCounter')
+    buckets = (
+        Demande.objects.order_by()
+        .values('municipalite_id', 'domaine', 'request_type', 'statut')
+        .annotate(count=Count('id'))
+    )
+    DemandeCounter.objects.bulk_create([DemandeCounter(**bucket) for bucket in buckets], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demande', '0004_remove_municipalite_name_arabe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domaine', models.CharField(choices=[('Infrastructure', 'Infrastructure'), ('Santé', 'Santé'), ('Education', 'Education'), ('Propriété', 'Propriété'), ('Transport', 'Transport'), ('Eclairage public', 'Eclairage public'), ('Autre', 'Autre')], max_length=50)),
+                ('request_type', models.CharField(choices=[('Reclamation', 'Reclamation'), ('Suggestion', 'Suggestion')], max_length=15)),
+                ('statut', models.CharField(choices=[('non traité', 'Non traité'), ('en cours', 'En cours'), ('traité', 'Traité')], max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('municipalite', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='demande.municipalite')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('municipalite', 'domaine', 'request_type', 'statut'), name='unique_demande_counter_bucket')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:40
+
+import django.utils.timezone
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+INDEXED_FIELDS = ['treated_at', 'updated_at']
+
+
+def create_field_indexes(apps, schema_editor):
+    # Index db_index=True construits sans bloquer les écritures, sous le nom que Django leur donne
+    Demande = apps.get_model('demande', 'Demande')
+    for name in INDEXED_FIELDS:
+        field = Demande._meta.get_field(name)
+        schema_editor.execute(schema_editor._create_index_sql(Demande, fields=[field], concurrently=True))
+
+
+class Migration(migrations.Migration):
+    atomic = False  # CREATE INDEX CONCURRENTLY : la table demande_demande reste accessible en écriture
+
+    dependencies = [
+        ('demande', '0005_demandecounter'),
+    ]
+
+    operations = [
+        # Colonnes ajoutées sans réécriture (valeur par défaut constante, PostgreSQL 11+) ;
+        # les index de treated_at et updated_at sont construits ensuite, concurremment
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AddField(
+                    model_name='demande',
+                    name='created_at',
+                    field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+                ),
+                migrations.AddField(
+                    model_name='demande',
+                    name='treated_at',
+                    field=models.DateTimeField(blank=True, editable=False, null=True),
+                ),
+                migrations.AddField(
+                    model_name='demande',
+                    name='updated_at',
+                    field=models.DateTimeField(auto_now=True),
+                ),
+                migrations.RunPython(create_field_indexes, migrations.RunPython.noop),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='demande',
+                    name='created_at',
+                    field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+                ),
+                migrations.AddField(
+                    model_name='demande',
+                    name='treated_at',
+                    field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+                ),
+                migrations.AddField(
+                    model_name='demande',
+                    name='updated_at',
+                    field=models.DateTimeField(auto_now=True, db_index=True),
+                ),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='demande',
+            index=models.Index(fields=['created_at'], include=('statut', 'domaine', 'request_type', 'municipalite'), name='demande_created_cov_idx'),
+        ),
+    ]
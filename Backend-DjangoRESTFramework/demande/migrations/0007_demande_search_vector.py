@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:42
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Chaque opération dans sa propre transaction : l'index GIN est construit sans verrou d'écriture.
+    # ATTENTION : la colonne générée stockée (search_vector) réécrit toute la table sous verrou
+    # ACCESS EXCLUSIVE (ni lecture ni écriture), pendant un temps proportionnel à sa taille
+    # (à mesurer sur une copie de la base) : à appliquer hors des heures d'affluence.
+    atomic = False
+
+    dependencies = [
+        ('demande', '0006_demande_timestamps'),
+    ]
+
+    operations = [
+        # Mots ASCII (français, accents repliés) : french_stem ; autres mots (arabe) : arabic_stem
+        migrations.RunSQL(
+            sql=[
+                "CREATE TEXT SEARCH CONFIGURATION demande_search (COPY = french)",
+                "ALTER TEXT SEARCH CONFIGURATION demande_search ALTER MAPPING FOR word, hword, hword_part WITH arabic_stem",
+            ],
+            reverse_sql=["DROP TEXT SEARCH CONFIGURATION demande_search"],
+        ),
+        migrations.AddField(
+            model_name='demande',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector(models.Func('titre', models.Value('àâäáãåçéèêëíìîïñóòôöõúùûüýÿÀÂÄÁÃÅÇÉÈÊËÍÌÎÏÑÓÒÔÖÕÚÙÛÜÝ'), models.Value('aaaaaaceeeeiiiinooooouuuuyyAAAAAACEEEEIIIINOOOOOUUUUY'), function='translate', output_field=models.TextField()), config='demande_search', weight='A'), '||', django.contrib.postgres.search.SearchVector(models.Func('description', models.Value('àâäáãåçéèêëíìîïñóòôöõúùûüýÿÀÂÄÁÃÅÇÉÈÊËÍÌÎÏÑÓÒÔÖÕÚÙÛÜÝ'), models.Value('aaaaaaceeeeiiiinooooouuuuyyAAAAAACEEEEIIIINOOOOOUUUUY'), function='translate', output_field=models.TextField()), config='demande_search', weight='B'), django.contrib.postgres.search.SearchConfig('demande_search')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        AddIndexConcurrently(
+            model_name='demande',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='demande_search_vector_idx'),
+        ),
+    ]
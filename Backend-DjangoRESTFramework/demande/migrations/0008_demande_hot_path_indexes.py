@@ -0,0 +1,105 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:50
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+TABLE = 'demande_demande'
+
+
+def replaced_indexes(connection):
+    """Contrainte unique de key (0002), index _like de key et index simple de municipalite_id (0001)."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, TABLE)
+    for name, info in constraints.items():
+        if name == 'demande_key_tracking_uniq' or info['primary_key'] or info['foreign_key']:
+            continue
+        if info['columns'] == ['key'] and info['unique']:
+            yield 'constraint', name
+        elif info['columns'] in (['key'], ['municipalite_id']) and info['index'] and not info['unique']:
+            yield 'index', name
+
+
+def drop_replaced_indexes(apps, schema_editor):
+    quote = schema_editor.quote_name
+    for kind, name in list(replaced_indexes(schema_editor.connection)):
+        if kind == 'constraint':
+            schema_editor.execute(f'ALTER TABLE {quote(TABLE)} DROP CONSTRAINT {quote(name)}')
+        else:
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}')
+
+
+def restore_replaced_indexes(apps, schema_editor):
+    schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "demande_demande_municipalite_id_01b219ff" ON "{TABLE}" ("municipalite_id")')
+    schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "demande_demande_key_88219014_like" ON "{TABLE}" ("key" varchar_pattern_ops)')
+    schema_editor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "demande_demande_key_key" UNIQUE ("key")')
+
+
+class Migration(migrations.Migration):
+    atomic = False  # CREATE INDEX CONCURRENTLY : pas de verrou d'écriture sur demande_demande
+
+    dependencies = [
+        ('demande', '0007_demande_search_vector'),
+    ]
+
+    operations = [
+        # 1. Nouveaux index construits sans bloquer les écritures
+        AddIndexConcurrently(
+            model_name='demande',
+            index=models.Index(fields=['statut', 'id'], name='demande_statut_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='demande',
+            index=models.Index(fields=['domaine', 'id'], name='demande_domaine_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='demande',
+            index=models.Index(fields=['request_type', 'id'], name='demande_request_type_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='demande',
+            index=models.Index(fields=['municipalite', 'id'], name='demande_municipalite_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='demande',
+            index=models.Index(condition=models.Q(('statut', 'traité'), _negated=True), fields=['municipalite', 'created_at'], name='demande_open_backlog_idx'),
+        ),
+        # 2. Contrainte couvrante : AddConstraint émettrait un CREATE UNIQUE INDEX bloquant.
+        # Une UniqueConstraint avec include est un index unique : l'état Django suffit à l'attacher.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql='CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "demande_key_tracking_uniq" '
+                        'ON "demande_demande" ("key") INCLUDE ("titre", "statut")',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS "demande_key_tracking_uniq"',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='demande',
+                    constraint=models.UniqueConstraint(fields=('key',), include=('titre', 'statut'), name='demande_key_tracking_uniq'),
+                ),
+            ],
+        ),
+        # 3. Anciens index supprimés seulement une fois leurs remplaçants construits. AlterField
+        # supprimerait l'index de la FK puis recréerait la contrainte (validée sur toute la table) :
+        # la base est modifiée par drop_replaced_indexes, l'état par AlterField.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(drop_replaced_indexes, restore_replaced_indexes),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='demande',
+                    name='key',
+                    field=models.CharField(blank=True, editable=False, max_length=6, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='demande',
+                    name='municipalite',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='demandes', to='demande.municipalite'),
+                ),
+            ],
+        ),
+    ]
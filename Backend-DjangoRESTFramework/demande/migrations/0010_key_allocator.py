@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+def reserve_existing_keys(apps, schema_editor):
+    # Les clés aléatoires déjà attribuées ne seront jamais produites par l'allocateur
+    Demande = apps.get_model('demande', 'Demande')
+    ReservedKey = apps.get_model('demande', 'ReservedKey')
+    keys = Demande.objects.exclude(key__isnull=True).exclude(key='').values_list('key', flat=True)
+    ReservedKey.objects.bulk_create([ReservedKey(key=key) for key in keys.iterator()], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demande', '0009_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservedKey',
+            fields=[
+                ('key', models.CharField(max_length=6, primary_key=True, serialize=False)),
+            ],
+        ),
+        # Numéros de séquence permutés en clés par demande/keys.py (36^6 valeurs)
+        migrations.RunSQL(
+            'CREATE SEQUENCE demande_key_seq MINVALUE 0 MAXVALUE 2176782335 START 0 NO CYCLE',
+            'DROP SEQUENCE demande_key_seq',
+        ),
+        migrations.RunPython(reserve_existing_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+def queue_existing_images(apps, schema_editor):
+    AttachmentBlob = apps.get_model('demande', 'AttachmentBlob')
+    AttachmentBlob.objects.filter(content_type__startswith='image/').update(variants_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demande', '0011_attachment_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachmentblob',
+            name='thumbnail',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='attachmentblob',
+            name='variants_status',
+            field=models.CharField(choices=[('none', 'None'), ('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='attachmentblob',
+            name='web',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=''),
+        ),
+        migrations.AlterField(
+            model_name='attachmentblob',
+            name='file',
+            field=models.FileField(db_index=True, max_length=255, upload_to=''),
+        ),
+        migrations.AddIndex(
+            model_name='attachmentblob',
+            index=models.Index(condition=models.Q(('variants_status', 'pending')), fields=['created_at'], name='attachmentblob_pending_idx'),
+        ),
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
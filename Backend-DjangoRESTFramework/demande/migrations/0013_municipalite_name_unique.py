@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:09
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_names(apps, schema_editor):
+    # Pas de fusion automatique (demandes et compteurs à rattacher) : les doublons sont à régler avant
+    Municipalite = apps.get_model('demande', 'Municipalite')
+    duplicates = (
+        Municipalite.objects.values('name_francais')
+        .annotate(total=Count('id')).filter(total__gt=1).order_by('name_francais')
+    )
+    names = [row['name_francais'] for row in duplicates]
+    if names:
+        raise RuntimeError(
+            "Municipalités en double, à renommer ou fusionner avant de rendre name_francais unique : "
+            + ', '.join(names)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demande', '0012_attachment_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_names, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='municipalite',
+            name='name_francais',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
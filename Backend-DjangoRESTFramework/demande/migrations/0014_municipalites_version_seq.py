@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demande', '0013_municipalite_name_unique'),
+    ]
+
+    operations = [
+        # Version de la liste des municipalités, incrémentée après chaque modification (demande/municipalites.py)
+        migrations.RunSQL(
+            'CREATE SEQUENCE municipalites_version_seq',
+            'DROP SEQUENCE municipalites_version_seq',
+        ),
+    ]
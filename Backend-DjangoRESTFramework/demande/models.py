@@ -1,11 +1,28 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import IntegrityError, models, transaction
 import uuid
-from django.utils.crypto import get_random_string
+from django.utils import timezone
+
+# Recherche plein texte : configuration PostgreSQL créée par la migration 0007.
+# Les mots ASCII passent par le stemmer français, les autres (arabe) par le stemmer arabe ;
+# les accents français sont repliés par translate() avant l'analyse.
+SEARCH_CONFIG = 'demande_search'
+ACCENTS = 'àâäáãåçéèêëíìîïñóòôöõúùûüýÿÀÂÄÁÃÅÇÉÈÊËÍÌÎÏÑÓÒÔÖÕÚÙÛÜÝ'
+ACCENTS_FOLDED = 'aaaaaaceeeeiiiinooooouuuuyyAAAAAACEEEEIIIINOOOOOUUUUY'
+
+
+def fold_accents(expression):
+    return models.Func(
+        expression, models.Value(ACCENTS), models.Value(ACCENTS_FOLDED),
+        function='translate', output_field=models.TextField(),
+    )
+
 
 # Model Municipalite
 class Municipalite(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    name_francais = models.CharField(max_length=255)
+    name_francais = models.CharField(max_length=255, unique=True)  # Index unique : recherche par nom
 
     def __str__(self):
         return self.name_francais
@@ -33,6 +50,13 @@ class Demande(models.Model):
         ('traité', 'Traité'),
     ]
 
+    # Statut cible -> statuts précédents autorisés (changements de statut en masse)
+    STATUT_TRANSITIONS = {
+        'non traité': ['en cours'],
+        'en cours': ['non traité', 'traité'],
+        'traité': ['non traité', 'en cours'],
+    }
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     nom_complet = models.CharField(max_length=255)
     email = models.EmailField()
@@ -40,17 +64,164 @@ class Demande(models.Model):
     adresse = models.TextField()
     request_type = models.CharField(max_length=15, choices=REQUETE_CHOICES)
     domaine = models.CharField(max_length=50, choices=DOMAINE_CHOICES)
-    municipalite = models.ForeignKey(Municipalite, on_delete=models.CASCADE, related_name='demandes')
+    municipalite = models.ForeignKey(Municipalite, on_delete=models.CASCADE, related_name='demandes', db_index=False)  # Voir demande_municipalite_id_idx
     titre = models.CharField(max_length=255)
     description = models.TextField()
     piece_jointe = models.FileField(upload_to='pieces_jointes/', blank=True, null=True)
-    key = models.CharField(max_length=6, unique=True, editable=False, null=True, blank=True)
+    key = models.CharField(max_length=6, editable=False, null=True, blank=True)  # Unicité : demande_key_tracking_uniq
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='non traité')
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    treated_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)  # Passage au statut "traité"
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector(fold_accents('titre'), config=SEARCH_CONFIG, weight='A')
+            + SearchVector(fold_accents('description'), config=SEARCH_CONFIG, weight='B')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        constraints = [
+            # Suivi public par clé : index-only scan, sans lire la table
+            models.UniqueConstraint(fields=['key'], include=['titre', 'statut'], name='demande_key_tracking_uniq'),
+        ]
+        indexes = [
+            # Index couvrant : les agrégations par période se font en index-only scan
+            models.Index(fields=['created_at'], include=['statut', 'domaine', 'request_type', 'municipalite'], name='demande_created_cov_idx'),
+            GinIndex(fields=['search_vector'], name='demande_search_vector_idx'),
+            # Liste filtrée et paginée par curseur (WHERE <filtre> AND id > curseur ORDER BY id)
+            models.Index(fields=['statut', 'id'], name='demande_statut_id_idx'),
+            models.Index(fields=['domaine', 'id'], name='demande_domaine_id_idx'),
+            models.Index(fields=['request_type', 'id'], name='demande_request_type_id_idx'),
+            models.Index(fields=['municipalite', 'id'], name='demande_municipalite_id_idx'),
+            # Demandes en attente (statut != 'traité') par municipalité
+            models.Index(
+                fields=['municipalite', 'created_at'],
+                condition=~models.Q(statut='traité'),
+                name='demande_open_backlog_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.titre
     
     def save(self, *args, **kwargs):
         if not self.key:  # Generate key only if it doesn't already exist
-            self.key = get_random_string(6).upper()  # Generate a random 6-character string
-        super().save(*args, **kwargs)  # Call the parent save method
+            from .keys import allocate_key
+            self.key = allocate_key()  # Clé unique issue de la séquence, sans risque de collision
+        with transaction.atomic():  # Les compteurs (signaux pre/post_save) sont mis à jour dans la même transaction
+            super().save(*args, **kwargs)  # Call the parent save method
+
+
+# Model DemandeCounter : nombre de demandes par (municipalite, domaine, request_type, statut)
+class DemandeCounter(models.Model):
+    BUCKET_FIELDS = ('municipalite_id', 'domaine', 'request_type', 'statut')
+
+    municipalite = models.ForeignKey(Municipalite, on_delete=models.CASCADE, related_name='counters')
+    domaine = models.CharField(max_length=50, choices=Demande.DOMAINE_CHOICES)
+    request_type = models.CharField(max_length=15, choices=Demande.REQUETE_CHOICES)
+    statut = models.CharField(max_length=20, choices=Demande.STATUT_CHOICES)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['municipalite', 'domaine', 'request_type', 'statut'], name='unique_demande_counter_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.municipalite_id} / {self.domaine} / {self.request_type} / {self.statut} : {self.count}"
+
+    @classmethod
+    def bucket_of(cls, demande):
+        return tuple(getattr(demande, field) for field in cls.BUCKET_FIELDS)
+
+    @classmethod
+    def add(cls, bucket, delta):
+        """Ajoute delta au compteur du bucket, en le créant au besoin."""
+        bucket = dict(zip(cls.BUCKET_FIELDS, bucket))
+        if cls.objects.filter(**bucket).update(count=models.F('count') + delta) or delta < 0:
+            return  # Un décrément sans compteur (ex. suppression en cascade de la municipalité) est ignoré
+        try:
+            with transaction.atomic():
+                cls.objects.create(count=delta, **bucket)
+        except IntegrityError:  # Créé entre-temps par une autre transaction
+            cls.objects.filter(**bucket).update(count=models.F('count') + delta)
+
+    @classmethod
+    def move(cls, old_bucket, new_bucket):
+        if old_bucket == new_bucket:
+            return
+        if old_bucket is not None:
+            cls.add(old_bucket, -1)
+        if new_bucket is not None:
+            cls.add(new_bucket, 1)
+
+
+# Model ReservedKey : clés jamais attribuées par l'allocateur (clés aléatoires antérieures à la migration 0010)
+class ReservedKey(models.Model):
+    key = models.CharField(max_length=6, primary_key=True)
+
+    def __str__(self):
+        return self.key
+
+
+# Model AttachmentBlob : contenu d'une pièce jointe, stocké une seule fois sous son empreinte SHA-256
+class AttachmentBlob(models.Model):
+    VARIANTS_STATUS_CHOICES = [
+        ('none', 'None'),  # Pas une image
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(max_length=255, db_index=True)  # pieces_jointes/sha256/<2 premiers caractères>/<empreinte><extension>
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Miniature et version allégée des images, générées par la commande generate_attachment_variants
+    variants_status = models.CharField(max_length=10, choices=VARIANTS_STATUS_CHOICES, default='none')
+    thumbnail = models.FileField(max_length=255, null=True, blank=True)
+    web = models.FileField(max_length=255, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(variants_status='pending'), name='attachmentblob_pending_idx'),
+        ]
+
+    def __str__(self):
+        return self.file.name
+
+
+# Model AttachmentUpload : envoi d'une pièce jointe par morceaux, reprenable après une coupure
+class AttachmentUpload(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)  # Octets déjà écrits : position du prochain morceau
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    blob = models.ForeignKey(AttachmentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='uploads')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+# Model ImportCheckpoint : avancement d'un import en masse (commande import_demandes)
+class ImportCheckpoint(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    position = models.BigIntegerField(default=0)  # Nombre d'enregistrements du fichier déjà traités
+    imported = models.BigIntegerField(default=0)
+    rejected = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} : {self.position}"
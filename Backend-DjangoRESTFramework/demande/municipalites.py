@@ -0,0 +1,118 @@
+import hashlib
+import time
+import unicodedata
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+from .models import Municipalite
+
+MUNICIPALITES_VERSION_SEQUENCE = 'municipalites_version_seq'  # Créée par la migration 0014
+# Un processus réutilise la version lue pendant ce délai (secondes) : modification d'un autre
+# processus visible au plus tard après ce délai, sans requête par lecture entre-temps
+MUNICIPALITES_VERSION_TTL = getattr(settings, 'MUNICIPALITES_VERSION_TTL', 2)
+MUNICIPALITES_CACHE_TIMEOUT = 24 * 60 * 60  # secondes ; la version change à chaque modification
+
+# Version lue par ce processus : {'value', 'read_at'}
+_version = {}
+# Dernière liste construite dans ce processus : {'version', 'body', 'etag', 'last_modified'}
+_local_entry = {}
+# Index des noms de ce processus : {'version', 'exact': {nom: Municipalite}, 'normalized': {nom normalisé: Municipalite}}
+_name_index = {}
+
+
+def list_cache_key(version):
+    return f'municipalites:list:{version}'
+
+
+def get_version():
+    """
+    Numéro de la dernière modification des municipalités : séquence PostgreSQL incrémentée
+    après chaque commit, donc partagée par tous les processus (le cache par défaut, LocMemCache,
+    est propre à chacun). Relue au plus une fois toutes les MUNICIPALITES_VERSION_TTL secondes.
+    """
+    global _version
+    now = time.monotonic()
+    if _version and now - _version['read_at'] < MUNICIPALITES_VERSION_TTL:
+        return _version['value']
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT last_value, is_called FROM {MUNICIPALITES_VERSION_SEQUENCE}')
+        last_value, is_called = cursor.fetchone()
+    _version = {'value': last_value if is_called else 0, 'read_at': now}
+    return _version['value']
+
+
+def bump_version():
+    global _version
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [MUNICIPALITES_VERSION_SEQUENCE])
+    _version = {}
+
+
+def get_municipalites_list():
+    """
+    Liste des municipalités déjà sérialisée en JSON (octets), avec son ETag et sa date de
+    modification. La requête et la sérialisation ne sont refaites qu'après une modification.
+    """
+    global _local_entry
+    version = get_version()
+    if _local_entry.get('version') == version:
+        return _local_entry
+
+    entry = cache.get(list_cache_key(version))
+    if entry is None:
+        from .serializers import MunicipaliteSerializer
+        data = MunicipaliteSerializer(Municipalite.objects.all(), many=True).data
+        body = JSONRenderer().render(data)  # Octets identiques à la réponse DRF
+        entry = {
+            'version': version,
+            'body': body,
+            'etag': '"%s"' % hashlib.md5(body).hexdigest(),
+            'last_modified': int(time.time()),  # Construite après la modification
+        }
+        cache.set(list_cache_key(version), entry, MUNICIPALITES_CACHE_TIMEOUT)
+    _local_entry = entry
+    return entry
+
+
+def normalize_name(name):
+    """Nom comparable : sans accents, sans casse, espaces réduits ("  Béja " -> "beja")."""
+    folded = ''.join(
+        char for char in unicodedata.normalize('NFKD', name)
+        if unicodedata.category(char) != 'Mn'
+    )
+    return ' '.join(folded.casefold().split())
+
+
+def get_name_index():
+    """Index nom -> Municipalite du processus, reconstruit quand la version des municipalités change."""
+    global _name_index
+    version = get_version()
+    if _name_index.get('version') != version:
+        exact, normalized = {}, {}
+        for municipalite in Municipalite.objects.all():
+            exact[municipalite.name_francais] = municipalite
+            # Deux noms qui ne diffèrent que par les accents : seule la forme exacte les distingue
+            normalized.setdefault(normalize_name(municipalite.name_francais), []).append(municipalite)
+        _name_index = {
+            'version': version,
+            'exact': exact,
+            'normalized': {name: matches[0] for name, matches in normalized.items() if len(matches) == 1},
+        }
+    return _name_index
+
+
+def forget_local_state():
+    """Oublie la version, la liste et l'index de ce processus (les autres suivent quand la version change)."""
+    global _version, _local_entry, _name_index
+    _version, _local_entry, _name_index = {}, {}, {}
+
+
+def find_municipalite(name):
+    """Municipalite par nom (exact, puis sans accents ni casse), None si inconnue."""
+    index = get_name_index()
+    municipalite = index['exact'].get(name) or index['normalized'].get(normalize_name(name))
+    if municipalite is None:
+        # Créée depuis la dernière lecture de la version : recherche par l'index unique
+        municipalite = Municipalite.objects.filter(name_francais=name).first()
+    return municipalite
@@ -0,0 +1,39 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class DemandeCursorPagination(CursorPagination):
+    """
+    Pagination par curseur (keyset) : chaque page filtre sur la dernière
+    position vue au lieu d'un OFFSET, donc la page N coûte autant que la page 1.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = 'id'  # Clé unique : ordre stable entre les pages
+
+    # Le mode paginé est activé dès que l'un de ces paramètres est présent
+    query_params = ('cursor', 'page_size')
+
+    def is_requested(self, request):
+        return any(param in request.query_params for param in self.query_params)
+
+
+class DemandeSearchPagination(PageNumberPagination):
+    """Résultats de recherche triés par pertinence, paginés par numéro de page."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def bounded_list(rows):
+    """
+    Liste non paginée (clients qui attendent un tableau), les plus récentes d'abord, bornée à
+    DEMANDE_LIST_MAX_ROWS lignes si ce réglage est défini. Retourne (lignes, tronquée).
+    """
+    limit = getattr(settings, 'DEMANDE_LIST_MAX_ROWS', None)
+    rows = rows.order_by('-created_at', 'id')
+    if limit is None:
+        return rows, False
+    rows = list(rows[:limit + 1])
+    return rows[:limit], len(rows) > limit
@@ -1,5 +1,27 @@
+import uuid
+from urllib.parse import quote
+from django.db import IntegrityError, connection, transaction
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Municipalite, Demande
+from .models import AttachmentUpload, Municipalite, Demande
+from .municipalites import find_municipalite, forget_local_state
+from .uploads import store_blob
+from .attachments import url_token
+
+def piece_jointe_thumbnail_url(demande_id, template=None):
+    """
+    Miniature servie par DemandePieceJointeView (l'original tant qu'elle n'est pas générée),
+    avec un jeton signé de courte durée : utilisable directement dans un <img src>.
+    """
+    url = (template or piece_jointe_thumbnail_template()).format(demande_id)
+    return f'{url}&token={quote(url_token(demande_id, "thumbnail"))}'
+
+
+def piece_jointe_thumbnail_template():
+    """URL de miniature avec "{}" à la place de l'id : un seul reverse() pour toute une liste."""
+    placeholder = str(uuid.UUID(int=0))
+    return (reverse('demande-piece-jointe', kwargs={'pk': placeholder}) + '?variant=thumbnail').replace(placeholder, '{}')
+
 
 class MunicipaliteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,27 +30,64 @@ class MunicipaliteSerializer(serializers.ModelSerializer):
 
 class DemandeSerializer(serializers.ModelSerializer):
     municipalite = serializers.CharField()  
+    upload = serializers.UUIDField(write_only=True, required=False)  # Pièce jointe envoyée par morceaux (uploads/)
 
     class Meta:
         model = Demande
-        fields = '__all__'
+        exclude = ['search_vector']
         read_only_fields = ['key'] 
 
     def validate_municipalite(self, value):
-        # Find the Municipalite based on the 'name_francais'
-        try:
-            municipalite = Municipalite.objects.get(name_francais=value)
-        except Municipalite.DoesNotExist:
+        # Index des noms en mémoire (sans accents ni casse), pas de requête par soumission
+        municipalite = find_municipalite(value)
+        if municipalite is None:
             raise serializers.ValidationError("Municipalite with this name does not exist.")
         return municipalite
 
+    def validate_upload(self, value):
+        upload = AttachmentUpload.objects.select_related('blob').filter(pk=value, status='complete').first()
+        if upload is None:
+            raise serializers.ValidationError("Upload not found or not complete.")
+        return upload
+
+    def attach(self, validated_data):
+        """
+        Pièce jointe -> nom du contenu partagé (AttachmentBlob), sans copie : envoi par morceaux
+        terminé, ou fichier envoyé en multipart, dédupliqué de la même façon.
+        """
+        upload = validated_data.pop('upload', None)
+        if upload is not None:
+            validated_data['piece_jointe'] = upload.blob.file.name
+        elif validated_data.get('piece_jointe'):
+            uploaded = validated_data['piece_jointe']
+            uploaded.seek(0)
+            validated_data['piece_jointe'] = store_blob(uploaded, uploaded.name, uploaded.size).file.name
+
     def create(self, validated_data):
-        municipalite_name = validated_data.pop('municipalite')
-        municipalite = self.validate_municipalite(municipalite_name)  # Get the municipalite object
+        municipalite = validated_data.pop('municipalite')  # Déjà résolue par validate_municipalite
+        try:
+            return self.create_demande(municipalite, dict(validated_data))
+        except IntegrityError:
+            # Index des noms périmé (municipalité supprimée par un autre processus) : relue en base
+            forget_local_state()
+            municipalite = Municipalite.objects.filter(name_francais=municipalite.name_francais).first()
+            if municipalite is None:
+                raise serializers.ValidationError({'municipalite': ["Municipalite with this name does not exist."]})
+            return self.create_demande(municipalite, validated_data)
 
-        demande = Demande.objects.create(municipalite=municipalite, **validated_data)
+    def create_demande(self, municipalite, validated_data):
+        with transaction.atomic():  # Le fichier est rangé avant que la ligne AttachmentBlob soit visible
+            self.attach(validated_data)
+            demande = Demande.objects.create(municipalite=municipalite, **validated_data)
+            # Clés étrangères vérifiées maintenant plutôt qu'au commit (contraintes différées)
+            connection.check_constraints()
         return demande
 
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            self.attach(validated_data)
+            return super().update(instance, validated_data)
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         municipalite = instance.municipalite
@@ -37,11 +96,79 @@ class DemandeSerializer(serializers.ModelSerializer):
             'id': str(municipalite.id),
             'name_francais': municipalite.name_francais
         }
+        representation['piece_jointe_thumbnail'] = piece_jointe_thumbnail_url(instance.id) if instance.piece_jointe else None
         return representation
 
 
+class DemandeListSerializer:
+    """
+    Sérialiseur en lecture seule pour les listes de demandes.
+    Les lignes sont lues avec .values() (jointure sur municipalite dans la même
+    requête) et construites directement, sans l'introspection des champs de
+    DemandeSerializer. La sortie est identique à celle de DemandeSerializer.
+    """
+    fields = [
+        'id', 'nom_complet', 'email', 'telephone', 'adresse', 'request_type',
+        'domaine', 'titre', 'description', 'piece_jointe', 'key', 'statut',
+        'created_at', 'updated_at', 'treated_at',
+    ]
+
+    storage = Demande._meta.get_field('piece_jointe').storage
+    datetime_field = serializers.DateTimeField()
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.thumbnail_url = piece_jointe_thumbnail_template()
+
+    @classmethod
+    def get_queryset(cls, queryset, *extra_fields):
+        return queryset.values(*cls.fields, 'municipalite_id', 'municipalite__name_francais', *extra_fields)
+
+    def to_representation(self, row):
+        piece_jointe = row['piece_jointe']
+        return {
+            'id': str(row['id']),
+            'municipalite': {
+                'id': str(row['municipalite_id']),
+                'name_francais': row['municipalite__name_francais'],
+            },
+            'nom_complet': row['nom_complet'],
+            'email': row['email'],
+            'telephone': row['telephone'],
+            'adresse': row['adresse'],
+            'request_type': row['request_type'],
+            'domaine': row['domaine'],
+            'titre': row['titre'],
+            'description': row['description'],
+            'piece_jointe': self.storage.url(piece_jointe) if piece_jointe else None,
+            'key': row['key'],
+            'statut': row['statut'],
+            'created_at': self.datetime_field.to_representation(row['created_at']),
+            'updated_at': self.datetime_field.to_representation(row['updated_at']),
+            'treated_at': self.datetime_field.to_representation(row['treated_at']),
+            'piece_jointe_thumbnail': piece_jointe_thumbnail_url(row['id'], self.thumbnail_url) if piece_jointe else None,
+        }
+
+    @property
+    def data(self):
+        return [self.to_representation(row) for row in self.rows]
+
+
 class DemandeStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = Demande
-        fields = ['titre', 'key', 'statut'] 
-    
\ No newline at end of file
+        fields = ['titre', 'key', 'statut']
+
+
+class DemandeBulkStatutSerializer(serializers.Serializer):
+    """Corps de POST demandes/bulk-statut/ : {"ids": [...]} ou {"keys": [...]}, et "statut"."""
+    MAX_IDENTIFIERS = 10000
+
+    ids = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False, max_length=MAX_IDENTIFIERS)
+    keys = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False, max_length=MAX_IDENTIFIERS)
+    statut = serializers.ChoiceField(choices=Demande.STATUT_CHOICES)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('keys' in attrs):
+            raise serializers.ValidationError("Exactly one of ids or keys is required.")
+        return attrs
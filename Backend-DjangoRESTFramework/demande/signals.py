@@ -0,0 +1,53 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Demande, DemandeCounter, Municipalite
+from .municipalites import bump_version, forget_local_state
+from .stats import invalidate_stats
+from .tracking import invalidate_tracking
+
+
+@receiver(pre_save, sender=Demande)
+def demande_pre_save(sender, instance, **kwargs):
+    # Verrouille la ligne et mémorise son ancien bucket pour déplacer le compteur après l'UPDATE
+    instance._previous_bucket = None
+    if not instance._state.adding:
+        previous = (
+            Demande.objects.select_for_update()
+            .filter(pk=instance.pk)
+            .values_list(*DemandeCounter.BUCKET_FIELDS)
+            .first()
+        )
+        instance._previous_bucket = previous
+
+    # Date de traitement : posée au passage à "traité", effacée si la demande est rouverte
+    if instance.statut != 'traité':
+        instance.treated_at = None
+    elif instance.treated_at is None:
+        instance.treated_at = timezone.now()
+
+
+@receiver(post_save, sender=Demande)
+def demande_post_save(sender, instance, created, **kwargs):
+    DemandeCounter.move(getattr(instance, '_previous_bucket', None), DemandeCounter.bucket_of(instance))
+    # Création ou changement de statut : les statistiques et le suivi en cache sont périmés.
+    # Après le commit : une lecture concurrente ne doit pas remettre en cache les anciennes valeurs
+    transaction.on_commit(invalidate_stats)
+    transaction.on_commit(partial(invalidate_tracking, instance.key))
+
+
+@receiver(post_delete, sender=Demande)
+def demande_post_delete(sender, instance, **kwargs):
+    DemandeCounter.move(DemandeCounter.bucket_of(instance), None)
+    transaction.on_commit(invalidate_stats)
+    transaction.on_commit(partial(invalidate_tracking, instance.key))
+
+
+@receiver(post_save, sender=Municipalite)
+@receiver(post_delete, sender=Municipalite)
+def municipalite_changed(sender, instance, **kwargs):
+    forget_local_state()  # Ce processus voit le changement tout de suite, même avant le commit
+    # Après le commit : un autre processus ne doit pas remettre en cache l'ancienne liste sous la nouvelle version
+    transaction.on_commit(bump_version)
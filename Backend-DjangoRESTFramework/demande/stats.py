@@ -0,0 +1,110 @@
+import hashlib
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from .models import Demande, DemandeCounter
+
+STATS_CACHE_KEY = 'demande:stats'
+STATS_CACHE_TIMEOUT = 60  # secondes
+TRENDS_GENERATION_KEY = 'demande:trends:generation'
+
+TREND_PERIODS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+TREND_GROUPS = {'statut': 'statut', 'domaine': 'domaine', 'municipalite': 'municipalite__name_francais'}
+TREND_DATE_FIELDS = ('created_at', 'treated_at')
+
+
+def compute_stats():
+    """
+    Calcule toutes les statistiques du tableau de bord à partir de la table
+    DemandeCounter : une seule requête, en O(nombre de buckets) et non O(demandes).
+    """
+    counters = (
+        DemandeCounter.objects.filter(count__gt=0)
+        .values_list('municipalite_id', 'municipalite__name_francais', 'domaine', 'request_type', 'statut', 'count')
+    )
+
+    stats = {
+        'total': 0,
+        'statut': {value: 0 for value, _label in Demande.STATUT_CHOICES},
+        'domaine': {value: 0 for value, _label in Demande.DOMAINE_CHOICES},
+        'request_type': {value: 0 for value, _label in Demande.REQUETE_CHOICES},
+        'municipalite': [],
+    }
+    municipalites = {}
+    for municipalite_id, name_francais, domaine, request_type, statut, count in counters:
+        stats['total'] += count
+        stats['statut'][statut] += count
+        stats['domaine'][domaine] += count
+        stats['request_type'][request_type] += count
+        if municipalite_id not in municipalites:
+            municipalites[municipalite_id] = {'id': str(municipalite_id), 'name_francais': name_francais, 'total': 0}
+            stats['municipalite'].append(municipalites[municipalite_id])
+        municipalites[municipalite_id]['total'] += count
+
+    total_traite = stats['statut']['traité']
+    stats['taux_traitement'] = round(total_traite / stats['total'] * 100, 2) if stats['total'] else 0
+    return stats
+
+
+def get_stats():
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_stats()
+        cache.set(STATS_CACHE_KEY, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_stats():
+    """Appelé après chaque écriture sur les demandes : statistiques et tendances en cache sont périmées."""
+    cache.delete(STATS_CACHE_KEY)
+    try:
+        cache.incr(TRENDS_GENERATION_KEY)  # Les tendances en cache sous l'ancienne génération ne sont plus lues
+    except ValueError:  # Clé absente (cache vidé)
+        cache.add(TRENDS_GENERATION_KEY, 1, None)
+
+
+def trends_generation():
+    generation = cache.get(TRENDS_GENERATION_KEY)
+    if generation is None:
+        cache.add(TRENDS_GENERATION_KEY, 0, None)
+        generation = cache.get(TRENDS_GENERATION_KEY, 0)
+    return generation
+
+
+def compute_trends(queryset, period='month', group_by='statut', date_field='created_at'):
+    """
+    Compte les demandes par période (date_trunc côté base) et par statut, domaine
+    ou municipalité. Une seule requête GROUP BY, servie par l'index couvrant sur created_at.
+    """
+    rows = (
+        queryset.filter(**{f'{date_field}__isnull': False})
+        .order_by()
+        .annotate(period=TREND_PERIODS[period](date_field))
+        .values('period', TREND_GROUPS[group_by])
+        .annotate(count=Count('id'))
+        .order_by('period')
+    )
+
+    results = []
+    current_period = None
+    for row in rows:
+        if row['period'] != current_period:
+            current_period = row['period']
+            results.append({'period': current_period.isoformat(), 'total': 0, 'counts': {}})
+        results[-1]['total'] += row['count']
+        results[-1]['counts'][row[TREND_GROUPS[group_by]]] = row['count']
+    return results
+
+
+def get_trends(queryset, params_key, period, group_by, date_field):
+    """
+    Tendances mises en cache STATS_CACHE_TIMEOUT secondes, par jeu de paramètres. La clé inclut
+    une génération incrémentée par invalidate_stats : une écriture rend toutes les entrées obsolètes.
+    """
+    digest = hashlib.md5(params_key.encode()).hexdigest()
+    cache_key = f'demande:trends:{trends_generation()}:{digest}'
+    trends = cache.get(cache_key)
+    if trends is None:
+        trends = compute_trends(queryset, period, group_by, date_field)
+        cache.set(cache_key, trends, STATS_CACHE_TIMEOUT)
+    return trends
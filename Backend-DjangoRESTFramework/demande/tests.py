@@ -1,3 +1,928 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import Group
+from django.utils import timezone
+from PIL import Image
+from authentification.models import User
+from authentification.serializers import CustomTokenObtainPairSerializer
+from Projet_de_stage import metrics
+from .keys import KEY_ALPHABET, KEY_LENGTH, KEY_SEQUENCE, allocate_keys, assign_keys, decode_key, encode_key, reserved_keys
+from .models import AttachmentBlob, AttachmentUpload, Demande, DemandeCounter, ImportCheckpoint, Municipalite, ReservedKey, SEARCH_CONFIG
+from .export import CSV_COLUMNS, export_lines
+from .serializers import DemandeListSerializer, DemandeSerializer, piece_jointe_thumbnail_url
+from .filters import parse_date_param
+from .stats import compute_trends, get_stats
+from .tracking import tracking_cache_key
+from . import municipalites
+from .uploads import UploadError, append_chunk, part_path, store_blob
+from .attachments import generate_variants, parse_range
 
-# Create your tests here.
+
+
+def new_demande(municipalite, **fields):
+    values = {
+        'nom_complet': 'Citoyen', 'email': 'citoyen@example.com', 'telephone': '123', 'adresse': 'Adresse',
+        'request_type': 'Suggestion', 'domaine': 'Autre', 'titre': 'Titre', 'description': 'Description',
+    }
+    values.update(fields)
+    return Demande(municipalite=municipalite, **values)
+
+
+def use_temporary_storage(test):
+    """MEDIA_ROOT et DEMANDE_UPLOAD_DIR dans un dossier temporaire supprimé après le test."""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    storage_dirs = override_settings(MEDIA_ROOT=os.path.join(directory.name, 'media'),
+                                     DEMANDE_UPLOAD_DIR=os.path.join(directory.name, 'uploads'))
+    storage_dirs.enable()
+    test.addCleanup(storage_dirs.disable)
+
+
+def auth_header(user):
+    token = CustomTokenObtainPairSerializer.get_token(user).access_token
+    return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+
+class HotQueryIndexTests(TestCase):
+    """
+    Vérifie par EXPLAIN que chaque requête fréquente sur Demande est servie par
+    un index. Avec enable_seqscan = off, le planificateur ne garde un Seq Scan
+    que si aucun index ne peut répondre : le test échoue alors.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Nabeul')
+        cls.demande = Demande.objects.create(
+            nom_complet='Ahmed Ben Ali',
+            email='ahmed@example.com',
+            telephone='123456789',
+            adresse='Avenue Habib Bourguiba, Tunis',
+            request_type='Reclamation',
+            domaine='Transport',
+            municipalite=cls.municipalite,
+            titre='Problème de transport',
+            description='Il y a un problème avec les transports publics.',
+        )
+
+    def explain(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.explain(queryset)
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIn(index_name, plan)
+
+    def test_tracking_key_lookup_is_index_only(self):
+        queryset = Demande.objects.filter(key=self.demande.key).values('titre', 'key', 'statut')
+        with connection.cursor() as cursor:
+            # Ne laisse que l'index-only scan ou le seq scan comme plans possibles
+            cursor.execute('SET LOCAL enable_indexscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+        plan = self.explain(queryset)
+        self.assertIn('Index Only Scan using demande_key_tracking_uniq', plan)
+
+    def test_filtered_cursor_pages(self):
+        for field, value, index_name in (
+            ('statut', 'non traité', 'demande_statut_id_idx'),
+            ('domaine', 'Transport', 'demande_domaine_id_idx'),
+            ('request_type', 'Reclamation', 'demande_request_type_id_idx'),
+            ('municipalite', self.municipalite.pk, 'demande_municipalite_id_idx'),
+        ):
+            with self.subTest(field=field):
+                queryset = Demande.objects.filter(**{field: value, 'id__gt': self.demande.pk}).order_by('id')[:51]
+                self.assertUsesIndex(queryset, index_name)
+
+    def test_open_backlog_per_municipalite(self):
+        queryset = Demande.objects.filter(municipalite=self.municipalite).exclude(statut='traité')
+        self.assertUsesIndex(queryset, 'demande_open_backlog_idx')
+
+    def test_trends_by_created_at(self):
+        queryset = Demande.objects.filter(created_at__gte=timezone.now() - timezone.timedelta(days=365))
+        self.assertUsesIndex(queryset.values('statut'), 'demande_created_cov_idx')
+
+    def test_treated_at_range(self):
+        queryset = Demande.objects.filter(treated_at__gte=timezone.now() - timezone.timedelta(days=30))
+        self.assertNotIn('Seq Scan', self.explain(queryset))
+
+    def test_full_text_search(self):
+        query = SearchQuery('transport', config=SEARCH_CONFIG, search_type='websearch')
+        self.assertUsesIndex(Demande.objects.filter(search_vector=query), 'demande_search_vector_idx')
+
+
+class KeyAllocatorTests(TestCase):
+    """Clés de suivi issues d'une séquence permutée : uniques par construction."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Sousse')
+
+    def tearDown(self):
+        reserved_keys.cache_clear()
+
+    def make_demande(self, **kwargs):
+        return Demande(
+            nom_complet='Citoyen', email='citoyen@example.com', telephone='123', adresse='Sousse',
+            request_type='Suggestion', domaine='Autre', municipalite=self.municipalite,
+            titre='Titre', description='Description', **kwargs,
+        )
+
+    def test_millions_of_keys_without_collision(self):
+        keys = allocate_keys(2_000_000)
+        self.assertEqual(len(keys), 2_000_000)
+        self.assertEqual(len(set(keys)), 2_000_000)
+        self.assertTrue(all(len(key) == KEY_LENGTH for key in keys[:1000]))
+        self.assertTrue(set(''.join(keys[:1000])) <= set(KEY_ALPHABET))
+
+    def test_permutation_is_reversible(self):
+        for index in (0, 1, 46655, 46656, 123456789, 36 ** 6 - 1):
+            self.assertEqual(decode_key(encode_key(index)), index)
+        # Des numéros consécutifs ne donnent pas des clés voisines
+        self.assertNotEqual(encode_key(1)[:3], encode_key(2)[:3])
+
+    def test_reserved_keys_are_skipped(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [KEY_SEQUENCE])
+            index = cursor.fetchone()[0]
+        ReservedKey.objects.create(key=encode_key(index + 1))
+        reserved_keys.cache_clear()
+        self.assertEqual(allocate_keys(1), [encode_key(index + 2)])
+
+    def test_save_and_bulk_create(self):
+        demande = self.make_demande()
+        demande.save()
+        demandes = Demande.objects.bulk_create(assign_keys([self.make_demande() for _ in range(500)]))
+        keys = [demande.key] + [d.key for d in demandes]
+        self.assertEqual(len(set(keys)), 501)
+        self.assertEqual(Demande.objects.filter(key__in=keys).count(), 501)
+
+
+class MetricsTests(TestCase):
+    """/metrics additionne les instantanés de tous les processus, au format texte Prometheus."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.settings_override = override_settings(METRICS_DIR=self.directory)
+        self.settings_override.enable()
+        metrics._registry = None
+
+    def tearDown(self):
+        self.settings_override.disable()
+        metrics._registry = None
+
+    def test_route_metrics_merged_across_processes(self):
+        for _ in range(2):
+            self.client.get('/municipalites/')
+        # Instantané écrit par un autre processus (worker d'emails)
+        with open(os.path.join(self.directory, 'autre.json'), 'w') as f:
+            json.dump({
+                'counters': [['http_requests_total', [['method', 'GET'], ['route', 'municipalites/'], ['status', 200]], 3]],
+                'histograms': [['mail_send_seconds', [], [0, 1] + [1] * 9, 0.009, 1]],
+            }, f)
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_requests_total{method="GET",route="municipalites/",status="200"} 5', body)
+        self.assertIn('http_request_db_queries_count{method="GET",route="municipalites/"} 2', body)
+        self.assertIn('http_response_size_bytes_bucket{method="GET",route="municipalites/",le="+Inf"} 2', body)
+        self.assertIn('mail_send_seconds_bucket{le="0.01"} 1', body)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+
+    def test_metrics_restricted_to_allowed_ips(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 403)
+        # Relayée par un proxy local : REMOTE_ADDR est 127.0.0.1 mais la requête vient d'ailleurs
+        self.assertEqual(self.client.get('/metrics', HTTP_X_FORWARDED_FOR='203.0.113.7').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='jeton-prometheus')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer autre').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer jeton-prometheus', HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(response.status_code, 200)
+
+
+class DemandeListTests(TestCase):
+    """GET /demandes/ : filtres, pagination par curseur et liste non paginée bornée."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.nabeul = Municipalite.objects.create(name_francais='Nabeul')
+        cls.sousse = Municipalite.objects.create(name_francais='Sousse')
+        for i in range(5):
+            new_demande(cls.nabeul, titre=f'Nabeul {i}', statut='traité' if i % 2 else 'non traité').save()
+        new_demande(cls.sousse, titre='Sousse', domaine='Transport').save()
+        cls.headers = auth_header(User.objects.create_user(email='agent@example.com', password='secret'))
+
+    def titles(self, query=''):
+        response = self.client.get(f'/demandes/{query}', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return sorted(demande['titre'] for demande in response.json())
+
+    def test_filters(self):
+        self.assertEqual(self.titles('?statut=traité'), ['Nabeul 1', 'Nabeul 3'])
+        self.assertEqual(self.titles('?domaine=Transport'), ['Sousse'])
+        self.assertEqual(self.titles(f'?municipalite={self.sousse.pk}'), ['Sousse'])
+        self.assertEqual(len(self.titles('?municipalite=Nabeul')), 5)
+        response = self.client.get('/demandes/?statut=inconnu', **self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('statut', response.json())
+
+    def test_cursor_pages_are_stable(self):
+        seen = []
+        url = '/demandes/?page_size=2'
+        while url:
+            page = self.client.get(url, **self.headers).json()
+            seen += [demande['id'] for demande in page['results']]
+            if len(seen) == 2:  # Une insertion pendant le parcours ne décale pas les pages suivantes
+                new_demande(self.sousse, titre='Nouvelle').save()
+            url = page['next']
+        original = {str(pk) for pk in Demande.objects.exclude(titre='Nouvelle').values_list('pk', flat=True)}
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertLessEqual(original, set(seen))
+
+    def test_unpaginated_list_is_bounded(self):
+        with override_settings(DEMANDE_LIST_MAX_ROWS=4):
+            response = self.client.get('/demandes/', **self.headers)
+        self.assertEqual(len(response.json()), 4)
+        self.assertEqual(response['X-Result-Truncated'], 'true')
+        response = self.client.get('/demandes/', **self.headers)  # Sans limite par défaut : tableau complet
+        self.assertEqual(len(response.json()), 6)
+        self.assertNotIn('X-Result-Truncated', response)
+
+
+class DemandeListSerializerTests(TestCase):
+    """Les lignes .values() donnent exactement la sortie de DemandeSerializer."""
+
+    def test_output_matches_model_serializer(self):
+        municipalite = Municipalite.objects.create(name_francais='Bizerte')
+        new_demande(municipalite).save()
+        new_demande(municipalite, piece_jointe='pieces_jointes/photo.jpg', statut='traité').save()
+        demandes = Demande.objects.order_by('id')
+        expected = json.loads(json.dumps(DemandeSerializer(demandes, many=True).data))
+        with self.assertNumQueries(1):
+            rows = DemandeListSerializer(DemandeListSerializer.get_queryset(demandes)).data
+        self.assertEqual(json.loads(json.dumps(rows)), expected)
+
+
+class DemandeExportTests(TestCase):
+    """Export en flux : une ligne par demande, en NDJSON ou en CSV."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Monastir')
+        for i in range(5):
+            new_demande(cls.municipalite, titre=f'Demande {i}', domaine='Transport' if i < 2 else 'Autre').save()
+        cls.headers = auth_header(User.objects.create_user(email='export@example.com', password='secret'))
+
+    def test_ndjson_stream(self):
+        response = self.client.get('/demandes/export/?domaine=Transport', **self.headers)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="demandes.ndjson"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(sorted(json.loads(line)['titre'] for line in lines), ['Demande 0', 'Demande 1'])
+
+    def test_csv_stream(self):
+        response = self.client.get('/demandes/export/?output=csv', **self.headers)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(','), CSV_COLUMNS)
+        self.assertEqual(len(lines), 6)
+        self.assertIn('Monastir', lines[1])
+
+    def test_chunks_and_invalid_format(self):
+        # Paquets plus petits que le nombre de lignes : rien n'est perdu entre deux paquets
+        self.assertEqual(len(list(export_lines(Demande.objects.all(), 'ndjson', chunk_size=2))), 5)
+        self.assertEqual(self.client.get('/demandes/export/?output=xml', **self.headers).status_code, 400)
+
+
+class DemandeStatsCacheTests(TestCase):
+    """Statistiques servies depuis le cache, invalidées après chaque création, modification ou suppression."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Gabès')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_then_invalidated_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            demande = new_demande(self.municipalite)
+            demande.save()
+        self.assertEqual(get_stats()['total'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_stats()['statut']['non traité'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            demande.statut = 'traité'
+            demande.save()
+        stats = get_stats()
+        self.assertEqual((stats['statut']['non traité'], stats['statut']['traité']), (0, 1))
+        self.assertEqual(stats['taux_traitement'], 100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            demande.delete()
+        self.assertEqual(get_stats()['total'], 0)
+
+    def test_stats_endpoint(self):
+        new_demande(self.municipalite, domaine='Santé').save()
+        headers = auth_header(User.objects.create_user(email='stats@example.com', password='secret'))
+        stats = self.client.get('/demandes/stats/', **headers).json()
+        self.assertEqual(stats['domaine']['Santé'], 1)
+        self.assertEqual(stats['municipalite'], [{'id': str(self.municipalite.pk), 'name_francais': 'Gabès', 'total': 1}])
+
+
+class DemandeCounterTests(TestCase):
+    """Compteurs par bucket tenus à jour à chaque écriture, et vérifiables contre les demandes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Kairouan')
+
+    def counts(self):
+        return dict(DemandeCounter.objects.filter(count__gt=0).values_list('statut', 'count'))
+
+    def test_counter_moves_with_status(self):
+        demande = new_demande(self.municipalite)
+        demande.save()
+        new_demande(self.municipalite).save()
+        self.assertEqual(self.counts(), {'non traité': 2})
+
+        demande.statut = 'en cours'
+        demande.save()
+        self.assertEqual(self.counts(), {'non traité': 1, 'en cours': 1})
+        demande.save()  # Même bucket : aucun mouvement
+        self.assertEqual(self.counts(), {'non traité': 1, 'en cours': 1})
+
+        demande.delete()
+        self.assertEqual(self.counts(), {'non traité': 1})
+
+    def test_verify_and_rebuild(self):
+        new_demande(self.municipalite).save()
+        call_command('rebuild_demande_counters', verify=True, stdout=io.StringIO())
+
+        DemandeCounter.objects.update(count=5)  # Dérive simulée
+        with self.assertRaises(CommandError):
+            call_command('rebuild_demande_counters', verify=True, stdout=io.StringIO())
+        self.assertEqual(self.counts(), {'non traité': 5})  # --verify ne modifie rien
+
+        call_command('rebuild_demande_counters', stdout=io.StringIO())
+        self.assertEqual(self.counts(), {'non traité': 1})
+        call_command('rebuild_demande_counters', verify=True, stdout=io.StringIO())
+
+
+class DemandeTrendsTests(TestCase):
+    """Date de traitement, paramètres de dates et tendances par période."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Tozeur')
+        cls.headers = auth_header(User.objects.create_user(email='trends@example.com', password='secret'))
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, created_at, **fields):
+        demande = new_demande(self.municipalite, **fields)
+        demande.save()
+        Demande.objects.filter(pk=demande.pk).update(created_at=created_at)
+        return demande
+
+    def test_treated_at_follows_status(self):
+        demande = new_demande(self.municipalite)
+        demande.save()
+        self.assertIsNone(demande.treated_at)
+        demande.statut = 'traité'
+        demande.save()
+        treated_at = demande.treated_at
+        self.assertIsNotNone(treated_at)
+        demande.save()  # Déjà traitée : la date n'est pas déplacée
+        self.assertEqual(demande.treated_at, treated_at)
+        demande.statut = 'en cours'
+        demande.save()
+        self.assertIsNone(Demande.objects.get(pk=demande.pk).treated_at)
+
+    def test_parse_date_param(self):
+        self.assertEqual(parse_date_param('2024-03-01'), timezone.make_aware(timezone.datetime(2024, 3, 1)))
+        self.assertEqual(parse_date_param('2024-03-01T10:30:00+00:00').hour, 10)
+        for invalid in ('2024-13-01', 'hier', ''):
+            self.assertIsNone(parse_date_param(invalid))
+        response = self.client.get('/demandes/analytics/?start=hier', **self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/demandes/analytics/?period=year', **self.headers).status_code, 400)
+
+    def test_monthly_buckets(self):
+        january, march = timezone.make_aware(timezone.datetime(2024, 1, 15)), timezone.make_aware(timezone.datetime(2024, 3, 2))
+        self.create(january)
+        self.create(january, statut='traité')
+        self.create(march)
+        trends = compute_trends(Demande.objects.all(), 'month', 'statut')
+        self.assertEqual([(row['total'], row['counts']) for row in trends], [
+            (2, {'non traité': 1, 'traité': 1}),
+            (1, {'non traité': 1}),
+        ])
+        self.assertTrue(trends[0]['period'].startswith('2024-01-01'))
+        self.assertEqual(compute_trends(Demande.objects.all(), 'month', 'statut', 'treated_at')[0]['total'], 1)
+
+    def test_trends_cache_invalidated_by_writes(self):
+        url = '/demandes/analytics/?period=day'
+        self.create(timezone.now())
+        self.assertEqual(self.client.get(url, **self.headers).json()['results'][0]['total'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            new_demande(self.municipalite).save()
+        self.assertEqual(self.client.get(url, **self.headers).json()['results'][0]['total'], 2)
+
+
+class DemandeSearchTests(TestCase):
+    """Recherche plein texte : accents et casse ignorés, mots arabes, pagination par pertinence."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Sfax')
+        new_demande(cls.municipalite, titre='Éclairage public défectueux', description='Lampadaires éteints.').save()
+        new_demande(cls.municipalite, titre='Coupure', description='انقطاع الماء في الحي منذ أسبوع').save()
+        for i in range(3):
+            new_demande(cls.municipalite, titre=f'Route {i}', description='Route abîmée' + ' route' * i).save()
+        cls.headers = auth_header(User.objects.create_user(email='search@example.com', password='secret'))
+
+    def search(self, query):
+        response = self.client.get('/demandes/search/', {'q': query}, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_accent_and_case_folded(self):
+        for query in ('eclairage', 'ÉCLAIRAGE', 'defectueux'):
+            with self.subTest(query=query):
+                self.assertEqual([r['titre'] for r in self.search(query)['results']], ['Éclairage public défectueux'])
+
+    def test_arabic_words(self):
+        for query in ('الماء', 'المَاءُ'):  # Voyelles courtes (harakat) repliées
+            with self.subTest(query=query):
+                self.assertEqual([r['titre'] for r in self.search(query)['results']], ['Coupure'])
+
+    def test_ranked_pages(self):
+        first = self.client.get('/demandes/search/?q=route&page_size=2', **self.headers).json()
+        self.assertEqual(first['count'], 3)
+        self.assertEqual(first['results'][0]['titre'], 'Route 2')  # Plus d'occurrences : mieux classée
+        second = self.client.get(first['next'], **self.headers).json()
+        self.assertEqual(len(second['results']), 1)
+        ranks = [r['rank'] for r in first['results'] + second['results']]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertEqual(self.client.get('/demandes/search/', **self.headers).status_code, 400)
+
+
+class DemandeTrackingTests(TestCase):
+    """Suivi public par clé : sans authentification, mis en cache, revalidé par ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.demande = new_demande(Municipalite.objects.create(name_francais='Mahdia'), titre='Trottoir')
+        cls.demande.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_etag_revalidation_without_authentication(self):
+        # Un jeton invalide est ignoré : la vue n'authentifie pas le suivi
+        response = self.client.get(f'/demandes/{self.demande.key}/', HTTP_AUTHORIZATION='Bearer invalide')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'titre': 'Trottoir', 'key': self.demande.key, 'statut': 'non traité'})
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/demandes/{self.demande.key}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_status_change_invalidated_after_commit(self):
+        etag = self.client.get(f'/demandes/{self.demande.key}/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.demande.statut = 'en cours'
+            self.demande.save()
+            # Avant le commit, l'entrée en cache reste celle de la version validée
+            self.assertIsNotNone(cache.get(tracking_cache_key(self.demande.key)))
+        self.assertTrue(callbacks)
+        response = self.client.get(f'/demandes/{self.demande.key}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['statut'], 'en cours')
+
+    def test_unknown_key_is_negatively_cached(self):
+        self.assertEqual(self.client.get('/demandes/ZZZZZZ/').status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/demandes/ZZZZZZ/').status_code, 404)
+
+
+class BulkTransitionTests(TestCase):
+    """Changement de statut en masse : transitions autorisées seulement, compteurs et caches à jour."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Béja')
+        cls.open = [new_demande(cls.municipalite) for _ in range(3)]
+        cls.treated = new_demande(cls.municipalite, statut='traité')
+        for demande in cls.open + [cls.treated]:
+            demande.save()
+        user = User.objects.create_user(email='bulk@example.com', password='secret')
+        user.groups.add(Group.objects.create(name='superadmin'))
+        cls.headers = auth_header(user)
+
+    def post(self, data):
+        return self.client.post('/demandes/bulk-statut/', data, content_type='application/json', **self.headers)
+
+    def test_allowed_and_rejected_transitions(self):
+        cache.set(tracking_cache_key(self.open[0].key), {'data': {}, 'etag': '"old"'})
+        ids = [str(demande.pk) for demande in self.open + [self.treated]] + ['inconnu']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post({'ids': ids, 'statut': 'en cours'})
+            self.assertIsNotNone(cache.get(tracking_cache_key(self.open[0].key)))  # Pas avant le commit
+        body = response.json()
+        self.assertEqual(body['updated'], 4)  # 'traité' -> 'en cours' est autorisé
+        self.assertEqual(body['results']['inconnu'], 'not_found')
+        self.assertIsNone(cache.get(tracking_cache_key(self.open[0].key)))
+
+        # 'en cours' n'est pas un prédécesseur de 'en cours'
+        response = self.post({'keys': [self.open[0].key], 'statut': 'en cours'})
+        self.assertEqual(response.json()['results'], {self.open[0].key: 'invalid_transition'})
+        self.assertEqual(Demande.objects.filter(statut='en cours').count(), 4)
+        self.assertIsNone(Demande.objects.get(pk=self.treated.pk).treated_at)
+
+    def test_counters_follow_the_move(self):
+        self.post({'ids': [str(demande.pk) for demande in self.open[:2]], 'statut': 'traité'})
+        counts = dict(DemandeCounter.objects.filter(count__gt=0).values_list('statut', 'count'))
+        self.assertEqual(counts, {'non traité': 1, 'traité': 3})
+        call_command('rebuild_demande_counters', verify=True, stdout=io.StringIO())
+        self.assertEqual(Demande.objects.filter(treated_at__isnull=False).count(), 3)
+
+    def test_request_limits(self):
+        too_many = [str(i) for i in range(10001)]
+        self.assertEqual(self.post({'ids': too_many, 'statut': 'traité'}).status_code, 400)
+        self.assertEqual(self.post({'ids': [], 'statut': 'traité'}).status_code, 400)
+        self.assertEqual(self.post({'ids': [str(self.open[0].pk)], 'statut': 'fermé'}).status_code, 400)
+        self.assertEqual(self.post({'ids': [str(self.open[0].pk)], 'keys': [self.open[0].key], 'statut': 'traité'}).status_code, 400)
+        # Corps JSON qui n'est pas un objet : 400, pas d'AttributeError
+        for body in ([{'ids': [str(self.open[0].pk)], 'statut': 'traité'}], json.dumps('traité'), '42'):
+            self.assertEqual(self.post(body).status_code, 400)
+
+
+class ImportDemandesTests(TestCase):
+    """import_demandes : point de reprise par lot, enregistrements invalides rejetés sans arrêter l'import."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Sousse')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'demandes.ndjson')
+
+    def write(self, lines, mode='w'):
+        with open(self.path, mode, encoding='utf-8') as f:
+            f.writelines(f'{line}\n' for line in lines)
+
+    def record(self, titre, **fields):
+        values = {'nom_complet': 'Citoyen', 'email': 'citoyen@example.com', 'telephone': '123', 'adresse': 'Adresse',
+                  'request_type': 'Suggestion', 'domaine': 'Autre', 'titre': titre, 'description': 'Description',
+                  'municipalite': 'sousse'}
+        values.update(fields)
+        return json.dumps(values)
+
+    def run_import(self, **options):
+        stderr = io.StringIO()
+        call_command('import_demandes', self.path, batch_size=2, stdout=io.StringIO(), stderr=stderr, **options)
+        return stderr.getvalue()
+
+    def test_checkpoint_and_resume(self):
+        self.write([self.record(f'Demande {i}') for i in range(3)])
+        self.run_import()
+        checkpoint = ImportCheckpoint.objects.get(name='demandes.ndjson')
+        self.assertEqual((checkpoint.position, checkpoint.imported), (3, 3))
+
+        # Relance : rien n'est réimporté ; seules les lignes ajoutées depuis le sont
+        self.run_import()
+        self.write([self.record('Demande 3'), self.record('Demande 4')], mode='a')
+        self.run_import()
+        self.assertEqual(Demande.objects.count(), 5)
+        self.assertEqual(DemandeCounter.objects.get(statut='non traité', municipalite=self.municipalite).count, 5)
+
+        self.run_import(restart=True)
+        self.assertEqual(Demande.objects.count(), 10)
+
+    def test_bad_records_are_reported_and_skipped(self):
+        self.write([self.record('Valide 1'), '{"titre": ', '', '[1, 2]', self.record('Valide 2')])
+        errors = self.run_import()
+        self.assertIn('ligne 2 : JSON invalide', errors)
+        self.assertIn('objet JSON attendu, reçu list', errors)
+        checkpoint = ImportCheckpoint.objects.get(name='demandes.ndjson')
+        self.assertEqual((checkpoint.position, checkpoint.imported, checkpoint.rejected), (4, 2, 2))
+        self.assertEqual(sorted(Demande.objects.values_list('titre', flat=True)), ['Valide 1', 'Valide 2'])
+
+    def test_unknown_municipalite(self):
+        self.write([self.record('Perdue', municipalite='Atlantide'), self.record('Trouvée', municipalite=str(self.municipalite.pk))])
+        errors = self.run_import()
+        self.assertIn("Enregistrement 1 rejeté : municipalité inconnue 'Atlantide'", errors)
+        self.assertEqual(list(Demande.objects.values_list('titre', flat=True)), ['Trouvée'])
+
+
+class AttachmentUploadTests(TestCase):
+    """Envoi par morceaux (uploads/) et stockage par empreinte partagé avec le multipart."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Mahdia')
+
+    def setUp(self):
+        use_temporary_storage(self)
+
+    def create(self, content, filename='plan.pdf'):
+        response = self.client.post('/uploads/', {'filename': filename, 'size': len(content)}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, upload_id, offset, data):
+        return self.client.put(f'/uploads/{upload_id}/', data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def upload(self, content, filename='plan.pdf'):
+        upload_id = self.create(content, filename)['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.put(upload_id, 0, content).json()['status'], 'complete')
+        return AttachmentUpload.objects.get(pk=upload_id)
+
+    def test_create_resume_and_wrong_offset(self):
+        created = self.create(b'0123456789')
+        self.assertEqual((created['offset'], created['status']), (0, 'pending'))
+        self.assertEqual(self.client.post('/uploads/', {'filename': 'vide.pdf', 'size': 0}, content_type='application/json').status_code, 400)
+
+        self.assertEqual(self.put(created['id'], 0, b'0123').json()['offset'], 4)
+        self.assertEqual(self.client.get(f'/uploads/{created["id"]}/').json()['offset'], 4)  # Position de reprise
+        response = self.put(created['id'], 0, b'0123')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.put(created['id'], 4, b'456789')
+        self.assertEqual(response.json()['status'], 'complete')
+        upload = AttachmentUpload.objects.select_related('blob').get(pk=created['id'])
+        self.assertFalse(os.path.exists(part_path(upload)))  # Supprimé après le commit
+        with default_storage.open(upload.blob.file.name) as f:
+            self.assertEqual(f.read(), b'0123456789')
+        self.assertEqual(self.put(created['id'], 10, b'x').status_code, 409)
+
+    def test_chunk_requires_content_length(self):
+        upload_id = self.create(b'0123')['id']
+        response = self.client.generic('PUT', f'/uploads/{upload_id}/', b'', content_type='application/octet-stream',
+                                       HTTP_UPLOAD_OFFSET='0', HTTP_TRANSFER_ENCODING='chunked', CONTENT_LENGTH='')
+        self.assertEqual(response.status_code, 411)
+
+    def test_concurrent_chunk_at_same_offset(self):
+        upload = AttachmentUpload.objects.get(pk=self.create(b'abcdef')['id'])
+
+        class SlowStream:
+            """Pendant que ce client envoie lentement, une reprise écrit le même morceau."""
+            def __init__(self):
+                self.sent = False
+
+            def read(self, size):
+                if self.sent:
+                    return b''
+                self.sent = True
+                append_chunk(upload.pk, 0, io.BytesIO(b'abc'), 3)
+                return b'XYZ'
+
+        with self.assertRaisesMessage(UploadError, 'Expected offset 3'):
+            append_chunk(upload.pk, 0, SlowStream(), 3)
+        upload.refresh_from_db()
+        self.assertEqual(upload.received, 3)
+        with open(part_path(upload), 'rb') as part:
+            self.assertEqual(part.read(), b'abc')  # Le morceau perdant n'a rien écrit
+
+    def test_same_content_is_stored_once(self):
+        first = self.upload(b'%PDF contenu identique')
+        second = self.upload(b'%PDF contenu identique', filename='copie.pdf')
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(AttachmentBlob.objects.count(), 1)
+
+        # Le formulaire Angular envoie la pièce jointe en multipart : même déduplication
+        response = self.client.post('/demandes/', {
+            'municipalite': 'Mahdia', 'nom_complet': 'Citoyen', 'email': 'citoyen@example.com', 'telephone': '123',
+            'adresse': 'Adresse', 'request_type': 'Suggestion', 'domaine': 'Autre', 'titre': 'Titre',
+            'description': 'Description', 'piece_jointe': SimpleUploadedFile('scan.pdf', b'%PDF contenu identique'),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Demande.objects.get().piece_jointe.name, first.blob.file.name)
+        self.assertEqual(AttachmentBlob.objects.count(), 1)
+        self.assertEqual(len(os.listdir(os.path.dirname(default_storage.path(first.blob.file.name)))), 1)
+
+    def test_purge_uploads(self):
+        stale = AttachmentUpload.objects.get(pk=self.create(b'abandonne')['id'])
+        recent = AttachmentUpload.objects.get(pk=self.create(b'en cours')['id'])
+        AttachmentUpload.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=25))
+        call_command('purge_uploads', stdout=io.StringIO())
+        self.assertEqual(list(AttachmentUpload.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertFalse(os.path.exists(part_path(stale)))
+        self.assertTrue(os.path.exists(part_path(recent)))
+
+
+class AttachmentDownloadTests(TestCase):
+    """Téléchargement des pièces jointes : plages, revalidation et miniatures."""
+    content = b'0123456789'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.municipalite = Municipalite.objects.create(name_francais='Bizerte')
+        cls.headers = auth_header(User.objects.create_user(email='pj@example.com', password='secret'))
+
+    def setUp(self):
+        use_temporary_storage(self)
+        with transaction.atomic():
+            self.blob = store_blob(io.BytesIO(self.content), 'note.txt', len(self.content))
+        self.demande = new_demande(self.municipalite, piece_jointe=self.blob.file.name)
+        self.demande.save()
+        self.url = f'/demandes/{self.demande.pk}/piece-jointe/'
+
+    def get(self, url=None, auth=True, **headers):
+        response = self.client.get(url or self.url, **(self.headers if auth else {}), **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        if getattr(response, 'file_to_stream', None):  # response.close() fermerait aussi la connexion de test
+            response.file_to_stream.close()
+        return response, body
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=2-5', 10), (2, 5))
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=8-', 10), (8, 9))
+        self.assertIsNone(parse_range('bytes=5-3', 10))  # Invalide : ignorée
+        self.assertFalse(parse_range('bytes=10-', 10))
+
+    def test_range_requests(self):
+        response, body = self.get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual((response.status_code, body), (206, b'2345'))
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+        response, body = self.get(HTTP_RANGE='bytes=5-3')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+        response, _ = self.get(HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range_and_if_none_match(self):
+        etag = f'"{self.blob.sha256}"'
+        response, body = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, body), (206, b'01'))
+        response, body = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"perime"')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+        response, body = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, body), (304, b''))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"autre"')[0].status_code, 200)
+
+    def test_multipart_image_gets_thumbnail(self):
+        image = io.BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(image, 'PNG')
+        response = self.client.post('/demandes/', {
+            'municipalite': 'Bizerte', 'nom_complet': 'Citoyen', 'email': 'citoyen@example.com', 'telephone': '123',
+            'adresse': 'Adresse', 'request_type': 'Suggestion', 'domaine': 'Autre', 'titre': 'Photo',
+            'description': 'Description', 'piece_jointe': SimpleUploadedFile('photo.png', image.getvalue()),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(AttachmentBlob.objects.filter(variants_status='pending').count(), 1)
+        self.assertEqual(generate_variants(), 1)
+
+        demande_id = response.json()['id']
+        self.url = f'/demandes/{demande_id}/piece-jointe/?variant=thumbnail'
+        response, body = self.get()
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(Image.open(io.BytesIO(body)).size, (320, 240))
+
+        rows = DemandeListSerializer(DemandeListSerializer.get_queryset(Demande.objects.filter(titre='Photo'))).data
+        self.assertTrue(rows[0]['piece_jointe_thumbnail'].startswith(self.url + '&token='))
+        # <img src> : pas d'en-tête Authorization, le jeton signé suffit
+        response, body = self.get(rows[0]['piece_jointe_thumbnail'], auth=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Image.open(io.BytesIO(body)).size, (320, 240))
+
+    def test_signed_url(self):
+        url = piece_jointe_thumbnail_url(self.demande.pk)
+        token = url.split('&token=')[1]
+        self.assertEqual(self.get(url, auth=False)[0].status_code, 200)
+
+        other = new_demande(self.municipalite, piece_jointe=self.blob.file.name)
+        other.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)  # Ni JWT ni jeton
+        self.assertEqual(self.client.get(self.url + '?token=' + token).status_code, 401)  # Jeton de la miniature, pas de l'original
+        self.assertEqual(self.client.get(f'/demandes/{other.pk}/piece-jointe/?variant=thumbnail&token={token}').status_code, 401)
+        self.assertEqual(self.client.get(url[:-1] + ('A' if url[-1] != 'A' else 'B')).status_code, 401)
+        with override_settings(DEMANDE_ATTACHMENT_URL_MAX_AGE=-1):
+            self.assertEqual(self.client.get(url).status_code, 401)
+
+
+class MunicipaliteListTests(TestCase):
+    """Liste des municipalités : octets précalculés, version partagée par la séquence PostgreSQL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Municipalite.objects.create(name_francais='Nabeul')
+
+    def setUp(self):
+        cache.clear()
+        municipalites.forget_local_state()
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/municipalites/')
+        self.assertEqual([m['name_francais'] for m in json.loads(response.content)], ['Nabeul'])
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(0):  # Version relue au plus toutes les MUNICIPALITES_VERSION_TTL secondes
+            response = self.client.get('/municipalites/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/municipalites/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get('/municipalites/', HTTP_IF_NONE_MATCH='"autre"').status_code, 200)
+
+    def test_save_bumps_version(self):
+        version = municipalites.get_version()
+        etag = self.client.get('/municipalites/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Municipalite.objects.create(name_francais='Kélibia')
+        self.assertEqual(municipalites.get_version(), version + 1)
+        response = self.client.get('/municipalites/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Kélibia', response.content.decode())
+
+    def test_change_from_another_process(self):
+        etag = self.client.get('/municipalites/')['ETag']
+        # Autre processus : ligne ajoutée et séquence incrémentée, sans les signaux de celui-ci
+        Municipalite.objects.bulk_create([Municipalite(name_francais='Hammamet')])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('municipalites_version_seq')")
+        self.assertEqual(self.client.get('/municipalites/', HTTP_IF_NONE_MATCH=etag).status_code, 304)  # Dans le délai
+        with mock.patch.object(municipalites, 'MUNICIPALITES_VERSION_TTL', 0):
+            response = self.client.get('/municipalites/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Hammamet', response.content.decode())
+
+
+class MunicipaliteNameTests(TestCase):
+    """Résolution du nom de municipalité d'une demande : index en mémoire, puis base de données."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.gabes = Municipalite.objects.create(name_francais='Gabès')
+
+    def setUp(self):
+        cache.clear()
+        municipalites.forget_local_state()
+
+    def submit(self, name):
+        return self.client.post('/demandes/', {
+            'municipalite': name, 'nom_complet': 'Citoyen', 'email': 'citoyen@example.com', 'telephone': '123',
+            'adresse': 'Adresse', 'request_type': 'Suggestion', 'domaine': 'Autre', 'titre': 'Titre',
+            'description': 'Description',
+        }, content_type='application/json')
+
+    def test_exact_and_folded_names(self):
+        self.assertEqual(municipalites.find_municipalite('Gabès'), self.gabes)
+        self.assertEqual(municipalites.find_municipalite('  gabes '), self.gabes)
+        self.assertEqual(municipalites.find_municipalite('GABÈS'), self.gabes)
+        self.assertEqual(self.submit('gabes').status_code, 201)
+        self.assertEqual(Demande.objects.get().municipalite, self.gabes)
+
+    def test_unknown_name(self):
+        response = self.submit('Atlantide')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('municipalite', response.json())
+
+    def delete_elsewhere(self):
+        # Supprimée par un autre processus : ni signal ni changement de version visible ici
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM demande_municipalite WHERE id = %s', [self.gabes.pk])
+
+    def test_stale_index_hit(self):
+        municipalites.find_municipalite('Gabès')  # Index construit
+        self.delete_elsewhere()
+        response = self.submit('Gabès')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('municipalite', response.json())
+
+    def test_stale_index_hit_recreated(self):
+        municipalites.find_municipalite('Gabès')
+        self.delete_elsewhere()
+        Municipalite.objects.bulk_create([Municipalite(name_francais='Gabès')])  # Recréée sous un autre id
+        self.assertEqual(self.submit('Gabès').status_code, 201)
+        self.assertNotEqual(Demande.objects.get().municipalite_id, self.gabes.pk)
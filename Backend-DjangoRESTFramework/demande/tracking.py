@@ -0,0 +1,39 @@
+import hashlib
+import json
+from django.core.cache import cache
+from .models import Demande
+from .serializers import DemandeStatusSerializer
+
+TRACKING_CACHE_TIMEOUT = 300  # secondes
+TRACKING_NOT_FOUND_TIMEOUT = 60  # cache négatif des clés inconnues
+NOT_FOUND = 'not-found'
+
+
+def tracking_cache_key(key):
+    return f'demande:tracking:{key}'
+
+
+def get_tracking(key):
+    """
+    Lecture à travers le cache de la clé de suivi : {'data': ..., 'etag': ...}
+    ou None si la clé n'existe pas (résultat négatif aussi mis en cache).
+    """
+    entry = cache.get(tracking_cache_key(key))
+    if entry is None:
+        # Seules les colonnes de demande_key_tracking_uniq sont lues (index-only scan)
+        demande = Demande.objects.filter(key=key).values('titre', 'key', 'statut').first()
+        if demande is None:
+            cache.set(tracking_cache_key(key), NOT_FOUND, TRACKING_NOT_FOUND_TIMEOUT)
+            return None
+        data = DemandeStatusSerializer(demande).data
+        etag = '"%s"' % hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        entry = {'data': data, 'etag': etag}
+        cache.set(tracking_cache_key(key), entry, TRACKING_CACHE_TIMEOUT)
+    elif entry == NOT_FOUND:
+        return None
+    return entry
+
+
+def invalidate_tracking(key):
+    if key:
+        cache.delete(tracking_cache_key(key))
@@ -0,0 +1,64 @@
+import uuid
+from collections import Counter
+from functools import partial
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .models import Demande, DemandeCounter
+from .stats import invalidate_stats
+from .tracking import tracking_cache_key
+
+BULK_CHUNK_SIZE = 1000
+
+
+def bulk_transition(identifiers, target, field='id'):
+    """
+    Passe au statut target toutes les demandes identifiées (par id ou key) dont le statut
+    actuel est un prédécesseur autorisé. Par paquet : un SELECT ... FOR UPDATE puis un
+    UPDATE ... WHERE statut IN (...), et les compteurs sont ajustés par bucket, pas par ligne.
+    Retourne {identifiant: 'updated' | 'not_found' | 'invalid_transition'}.
+    """
+    predecessors = Demande.STATUT_TRANSITIONS[target]
+    outcomes = {identifier: 'not_found' for identifier in identifiers}
+    lookup = {}
+    for identifier in outcomes:
+        try:
+            lookup[str(uuid.UUID(identifier)) if field == 'id' else identifier] = identifier
+        except ValueError:
+            pass  # Id invalide : reste 'not_found'
+
+    now = timezone.now()
+    moved_keys = []
+    with transaction.atomic():
+        values = list(lookup)
+        for start in range(0, len(values), BULK_CHUNK_SIZE):
+            rows = list(
+                Demande.objects.select_for_update()
+                .filter(**{f'{field}__in': values[start:start + BULK_CHUNK_SIZE]})
+                .values('id', 'key', *DemandeCounter.BUCKET_FIELDS)
+            )
+            movable = [row for row in rows if row['statut'] in predecessors]
+            for row in rows:
+                outcomes[lookup[str(row[field])]] = 'updated' if row['statut'] in predecessors else 'invalid_transition'
+            if not movable:
+                continue
+
+            Demande.objects.filter(pk__in=[row['id'] for row in movable], statut__in=predecessors).update(
+                statut=target,
+                updated_at=now,
+                treated_at=now if target == 'traité' else None,
+            )
+            # QuerySet.update() ne déclenche pas les signaux : compteurs et caches sont mis à jour ici
+            previous_buckets = Counter(tuple(row[name] for name in DemandeCounter.BUCKET_FIELDS) for row in movable)
+            for bucket, count in previous_buckets.items():
+                new_bucket = tuple(
+                    target if name == 'statut' else value
+                    for name, value in zip(DemandeCounter.BUCKET_FIELDS, bucket)
+                )
+                DemandeCounter.add(bucket, -count)
+                DemandeCounter.add(new_bucket, count)
+            moved_keys += [tracking_cache_key(row['key']) for row in movable]
+        # Après le commit : une lecture concurrente ne doit pas remettre en cache l'ancien statut
+        transaction.on_commit(partial(cache.delete_many, moved_keys))
+        transaction.on_commit(invalidate_stats)
+    return outcomes
@@ -0,0 +1,158 @@
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+from functools import partial
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import AttachmentBlob, AttachmentUpload
+
+READ_SIZE = 64 * 1024  # Les morceaux sont lus et écrits par blocs : jamais de fichier entier en mémoire
+
+
+class UploadError(Exception):
+    pass
+
+
+def part_path(upload):
+    return os.path.join(settings.DEMANDE_UPLOAD_DIR, f'{upload.id}.part')
+
+
+def blob_name(digest, filename):
+    extension = os.path.splitext(filename)[1].lower()[:10]
+    return f'pieces_jointes/sha256/{digest[:2]}/{digest}{extension}'
+
+
+def create_upload(filename, size):
+    if size < 1 or size > settings.DEMANDE_UPLOAD_MAX_SIZE:
+        raise UploadError(f'File size must be between 1 and {settings.DEMANDE_UPLOAD_MAX_SIZE} bytes')
+    upload = AttachmentUpload.objects.create(filename=os.path.basename(filename)[:255], size=size)
+    os.makedirs(settings.DEMANDE_UPLOAD_DIR, exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def check_chunk(upload, offset, length):
+    if upload.status == 'complete':
+        raise UploadError('Upload already complete')
+    if offset != upload.received:
+        raise UploadError(f'Expected offset {upload.received}')
+    if length > upload.size - upload.received:
+        raise UploadError('Chunk exceeds the declared file size')
+
+
+def receive_chunk(stream, chunk, length):
+    """Copie au plus length octets de stream dans chunk ; si la connexion coupe, garde ce qui a été reçu."""
+    received = 0
+    try:
+        while received < length:
+            data = stream.read(min(READ_SIZE, length - received))
+            if not data:
+                break
+            chunk.write(data)
+            received += len(data)
+    except OSError:  # Client déconnecté
+        pass
+    return received
+
+
+def append_chunk(upload_id, offset, stream, length):
+    """
+    Ajoute le morceau [offset, offset + length) lu depuis stream. Le corps est d'abord reçu dans
+    un fichier temporaire, sans transaction ni verrou : un client lent ou bloqué n'immobilise ni
+    connexion à la base ni les reprises. La position est ensuite avancée par compare-and-set
+    (received == offset) et le morceau recopié localement dans le .part sous ce verrou de ligne.
+    Si la connexion coupe, les octets reçus sont conservés et le client reprend à upload.received.
+    Le dernier morceau termine l'envoi.
+    """
+    upload = AttachmentUpload.objects.get(pk=upload_id)
+    check_chunk(upload, offset, length)
+
+    with tempfile.NamedTemporaryFile(dir=settings.DEMANDE_UPLOAD_DIR, suffix='.chunk') as chunk:
+        received = receive_chunk(stream, chunk, length)
+        if not received:
+            return upload
+        chunk.flush()
+        with transaction.atomic():
+            claimed = AttachmentUpload.objects.filter(pk=upload_id, status='pending', received=offset).update(
+                received=offset + received, updated_at=timezone.now(),
+            )
+            if not claimed:  # Un autre morceau est arrivé à cette position entre-temps
+                raise UploadError(f'Expected offset {AttachmentUpload.objects.get(pk=upload_id).received}')
+            upload = AttachmentUpload.objects.get(pk=upload_id)
+            chunk.seek(0)
+            with open(part_path(upload), 'r+b') as part:
+                part.seek(offset)
+                part.truncate()  # Octets d'un morceau interrompu non comptabilisés
+                shutil.copyfileobj(chunk, part, READ_SIZE)
+            if upload.received == upload.size:
+                finish_upload(upload)
+    return upload
+
+
+def store_blob(source, filename, size):
+    """
+    Range le contenu de source (fichier binaire ouvert) dans le stockage par empreinte, sauf
+    s'il existe déjà. Seule la transaction qui crée la ligne AttachmentBlob écrit le fichier :
+    une transaction concurrente avec le même contenu attend son commit sur la clé primaire
+    puis réutilise la ligne, sans rien écrire. À appeler dans une transaction.
+    """
+    digest = hashlib.sha256()
+    for data in iter(lambda: source.read(READ_SIZE), b''):
+        digest.update(data)
+    digest = digest.hexdigest()
+
+    blob = AttachmentBlob.objects.filter(pk=digest).first()
+    if blob is not None:
+        return blob
+    name = blob_name(digest, filename)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    blob, created = AttachmentBlob.objects.get_or_create(sha256=digest, defaults={
+        'file': name,
+        'size': size,
+        'content_type': content_type,
+        # Les images attendent leurs miniatures (worker generate_attachment_variants)
+        'variants_status': 'pending' if content_type.startswith('image/') else 'none',
+    })
+    if not created:
+        return blob
+
+    if default_storage.exists(name) and default_storage.size(name) != size:
+        default_storage.delete(name)  # Écriture interrompue d'une transaction annulée
+    if not default_storage.exists(name):
+        source.seek(0)
+        saved = default_storage.save(name, File(source))
+        if saved != name:
+            blob.file = saved
+            blob.save(update_fields=['file'])
+    return blob
+
+
+def remove_part(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def finish_upload(upload):
+    """Range le fichier reçu dans le stockage (ou réutilise le contenu identique déjà présent)."""
+    path = part_path(upload)
+    with open(path, 'rb') as part:
+        blob = store_blob(part, upload.filename, upload.size)
+    # Supprimé après le commit seulement : si la transaction échoue, l'envoi reste reprenable
+    transaction.on_commit(partial(remove_part, path))
+
+    upload.blob = blob
+    upload.status = 'complete'
+    upload.save(update_fields=['blob', 'status', 'updated_at'])
+    return blob
+
+
+def discard_upload(upload):
+    remove_part(part_path(upload))
+    upload.delete()
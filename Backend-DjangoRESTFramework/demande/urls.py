@@ -1,13 +1,21 @@
 from django.urls import path
-from .views import DemandeTotaleView, MunicipaliteView, DemandeView, TauxTraitementView, TraiteTotaleView
+from .views import AttachmentUploadView, DemandeAnalyticsView, DemandeBulkStatutView, DemandePieceJointeView, DemandeExportView, DemandeSearchView, DemandeStatsView, DemandeTotaleView, MunicipaliteView, DemandeView, TauxTraitementView, TraiteTotaleView
 
 urlpatterns = [
     path('municipalites/', MunicipaliteView.as_view(), name='municipalites-list'),
     path('municipalites/<str:pk>/', MunicipaliteView.as_view(), name='municipalites-detail'),  # Add pk path
     path('demandes/', DemandeView.as_view(), name='demandes-list'),
+    path('demandes/bulk-statut/', DemandeBulkStatutView.as_view(), name='demande-bulk-statut'),
+    path('demandes/search/', DemandeSearchView.as_view(), name='demande-search'),
+    path('demandes/export/', DemandeExportView.as_view(), name='demande-export'),
+    path('demandes/analytics/', DemandeAnalyticsView.as_view(), name='demande-analytics'),
+    path('demandes/stats/', DemandeStatsView.as_view(), name='demande-stats'),
     path('demandes/total/', DemandeTotaleView.as_view(), name='demande-total'),
     path('demandes/traite/', TraiteTotaleView.as_view(), name='demande-traite'),
     path('demandes/taux-traitement/', TauxTraitementView.as_view(), name='taux-traitement'),
     path('demandes/<str:pk>/', DemandeView.as_view(), name='demandes-detail'),
+    path('demandes/<uuid:pk>/piece-jointe/', DemandePieceJointeView.as_view(), name='demande-piece-jointe'),
+    path('uploads/', AttachmentUploadView.as_view(), name='upload-create'),
+    path('uploads/<uuid:pk>/', AttachmentUploadView.as_view(), name='upload-detail'),
     
 ]
\ No newline at end of file
@@ -1,13 +1,24 @@
-from urllib import request
+import os
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.permissions import IsAuthenticated
-from django.core.mail import send_mail
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Municipalite, Demande
-from .serializers import MunicipaliteSerializer, DemandeSerializer , DemandeStatusSerializer
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from notifications.mail import queue_mail
+from .models import AttachmentUpload, Municipalite, Demande
+from .serializers import MunicipaliteSerializer, DemandeSerializer , DemandeBulkStatutSerializer, DemandeListSerializer
+from .filters import filter_demandes, parse_date_param, search_demandes
+from .export import EXPORT_FORMATS, export_lines
+from .stats import get_stats, get_trends, TREND_PERIODS, TREND_GROUPS, TREND_DATE_FIELDS
+from .pagination import DemandeCursorPagination, DemandeSearchPagination, bounded_list
+from .tracking import get_tracking
+from .municipalites import get_municipalites_list
+from .transitions import bulk_transition
+from .uploads import UploadError, append_chunk, create_upload
+from .attachments import VARIANTS, attachment_file, check_url_token, serve_attachment
 from rest_framework.permissions import AllowAny
+from authentification.roles import SUPERADMIN, has_role
 
 
 
@@ -19,22 +30,6 @@ class PublicPermission(permissions.BasePermission):
         return request.method in ['GET', 'POST']
 
 
-class IsSuperAdmin(permissions.BasePermission):
-    """
-    Custom permission for superadmin users, allowing full access (POST, PUT, DELETE).
-    """
-    def has_permission(self, request, view):
-        return request.user.groups.filter(name='superadmin').exists()
-
-
-class IsAdmin(permissions.BasePermission):
-    """
-    Custom permission for admin users, allowing partial access (POST, PUT, DELETE for certain views).
-    """
-    def has_permission(self, request, view):
-        return request.user.groups.filter(name='admin').exists()
-
-
 class MunicipaliteView(APIView):
     def get_permissions(self):
         """Allow GET requests to be public, but require authentication for other methods."""
@@ -42,6 +37,12 @@ class MunicipaliteView(APIView):
             return [permissions.AllowAny()]  # Public access
         return [permissions.IsAuthenticated()]  # Authentication required
 
+    def get_authenticators(self):
+        # Lecture publique : pas de validation de jeton ni de lecture du User
+        if self.request.method == 'GET':
+            return []
+        return super().get_authenticators()
+
     def get(self, request, pk=None):
         if pk:
             try:
@@ -51,12 +52,25 @@ class MunicipaliteView(APIView):
             except Municipalite.DoesNotExist:
                 return Response({'error': 'Municipalite not found'}, status=status.HTTP_404_NOT_FOUND)
         else:
-            municipalites = Municipalite.objects.all()
-            serializer = MunicipaliteSerializer(municipalites, many=True)
-            return Response(serializer.data)
+            # Octets précalculés, invalidés par version à chaque modification (signaux)
+            entry = get_municipalites_list()
+            if_none_match = request.headers.get('If-None-Match')
+            if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            if if_none_match is not None:
+                not_modified = entry['etag'] in parse_etags(if_none_match)
+            else:
+                not_modified = if_modified_since is not None and entry['last_modified'] <= if_modified_since
+            if not_modified:
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = HttpResponse(entry['body'], content_type='application/json')
+            response['ETag'] = entry['etag']
+            response['Last-Modified'] = http_date(entry['last_modified'])
+            response['Cache-Control'] = 'no-cache'
+            return response
 
     def post(self, request):
-        if not request.user.groups.filter(name='superadmin').exists():
+        if not has_role(request, SUPERADMIN):
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         serializer = MunicipaliteSerializer(data=request.data)
         if serializer.is_valid():
@@ -65,7 +79,7 @@ class MunicipaliteView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request, pk):
-        if not request.user.groups.filter(name='superadmin').exists():
+        if not has_role(request, SUPERADMIN):
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         try:
             municipalite = Municipalite.objects.get(pk=pk)
@@ -78,7 +92,7 @@ class MunicipaliteView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
-        if not request.user.groups.filter(name='superadmin').exists():
+        if not has_role(request, SUPERADMIN):
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         try:
             municipalite = Municipalite.objects.get(pk=pk)
@@ -93,24 +107,45 @@ class DemandeView(APIView):
         # Define permissions based on the request method
         if self.request.method in ['POST']:
             return [AllowAny()]  # Public access
-        elif 'key' in self.kwargs and self.request.method == 'GET':
+        elif 'pk' in self.kwargs and self.request.method == 'GET':
             return [AllowAny()]
         elif self.request.method in ['GET', 'PUT', 'DELETE']:
             return [IsAuthenticated()]  # Private access
         return super().get_permissions()
 
-    def get(self, request, key=None):
+    def get_authenticators(self):
+        # Le suivi public par clé n'authentifie pas : pas de lecture du User à chaque interrogation
+        if 'pk' in self.kwargs and self.request.method == 'GET':
+            return []
+        return super().get_authenticators()
+
+    def get(self, request, pk=None):
+        key = pk  # Sur GET, le paramètre de l'URL est la clé de suivi
         if key:  # Si une clé est fournie
-            try:
-                demande = Demande.objects.get(key=key)  # Recherche par clé
-                serializer = DemandeStatusSerializer(demande)  # Utilisation de DemandeStatusSerializer
-                return Response(serializer.data)
-            except Demande.DoesNotExist:
+            tracking = get_tracking(key)  # Cache de lecture, y compris pour les clés inconnues
+            if tracking is None:
                 return Response({'error': 'Demande not found'}, status=status.HTTP_404_NOT_FOUND)
+            if tracking['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response(tracking['data'])
+            response['ETag'] = tracking['etag']
+            response['Cache-Control'] = 'no-cache'  # Le navigateur revalide avec If-None-Match
+            return response
         else:  # Si aucune clé n'est fournie
-            demandes = Demande.objects.all()  # Récupère toutes les demandes
-            serializer = DemandeSerializer(demandes, many=True)  # Utilisation de DemandeSerializer
-            return Response(serializer.data)
+            demandes = filter_demandes(Demande.objects.all(), request.query_params)
+            rows = DemandeListSerializer.get_queryset(demandes)  # Une seule requête, jointure incluse
+            paginator = DemandeCursorPagination()
+            if paginator.is_requested(request):  # Mode paginé par curseur (?cursor= / ?page_size=)
+                page = paginator.paginate_queryset(rows, request, view=self)
+                serializer = DemandeListSerializer(page)
+                return paginator.get_paginated_response(serializer.data)
+            rows, truncated = bounded_list(rows)  # Sans pagination : au plus DEMANDE_LIST_MAX_ROWS lignes s'il est défini
+            serializer = DemandeListSerializer(rows)
+            response = Response(serializer.data)
+            if truncated:
+                response['X-Result-Truncated'] = 'true'  # Suite accessible avec ?cursor= / ?page_size=
+            return response
 
     def post(self, request):
         serializer = DemandeSerializer(data=request.data)
@@ -130,7 +165,7 @@ class DemandeView(APIView):
                 f"URL pour suivre votre demande : http://localhost:4200/suivdemande\n\n"
                 f"Cordialement,\nL'équipe"
             )
-            send_mail(
+            queue_mail(  # Envoyé par le worker send_queued_mail, hors du cycle de la requête
                 subject="Confirmation de votre demande",
                 message=user_message,
                 from_email='malekhichri2003@gmail.com',
@@ -159,7 +194,7 @@ class DemandeView(APIView):
             new_statut = request.data['statut']
             if new_statut not in dict(Demande.STATUT_CHOICES):
                 return Response({'error': 'Invalid statut choice'}, status=status.HTTP_400_BAD_REQUEST)
-        demande.statut = new_statut
+            demande.statut = new_statut
 
     # Mettre à jour les autres champs
         serializer = DemandeSerializer(demande, data=request.data, partial=True)
@@ -168,6 +203,120 @@ class DemandeView(APIView):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+class DemandeBulkStatutView(APIView):
+    """
+    Change le statut de plusieurs demandes en une fois : {"ids": [...]} ou {"keys": [...]}
+    et "statut". Seules les demandes dont le statut actuel autorise la transition sont modifiées ;
+    le résultat est donné pour chaque identifiant.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = DemandeBulkStatutSerializer(data=request.data)  # Corps qui n'est pas un objet : 400
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        new_statut = serializer.validated_data['statut']
+        field = 'key' if 'keys' in serializer.validated_data else 'id'
+        identifiers = serializer.validated_data['keys' if field == 'key' else 'ids']
+
+        results = bulk_transition(identifiers, new_statut, field=field)
+        return Response({
+            'statut': new_statut,
+            'updated': sum(1 for outcome in results.values() if outcome == 'updated'),
+            'results': results,
+        })
+
+
+class DemandeSearchView(APIView):
+    """
+    Recherche plein texte (?q=) dans le titre et la description des demandes,
+    résultats triés par pertinence et paginés (?page=, ?page_size=). Accepte les filtres de la liste.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'error': 'Search query (q) is required'}, status=status.HTTP_400_BAD_REQUEST)
+        demandes = search_demandes(filter_demandes(Demande.objects.all(), request.query_params), text)
+        rows = DemandeListSerializer.get_queryset(demandes, 'rank')
+        paginator = DemandeSearchPagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        serializer = DemandeListSerializer(page)
+        results = [
+            dict(demande, rank=row['rank'])
+            for row, demande in zip(page, serializer.data)
+        ]
+        return paginator.get_paginated_response(results)
+
+
+class DemandeExportView(APIView):
+    """
+    Exporte les demandes filtrées en NDJSON (par défaut) ou en CSV (?output=csv).
+    La réponse est envoyée en flux, ligne par ligne, sans charger la table en mémoire.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': 'Invalid output format'}, status=status.HTTP_400_BAD_REQUEST)
+        demandes = filter_demandes(Demande.objects.all(), request.query_params)
+        response = StreamingHttpResponse(
+            export_lines(demandes, export_format),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="demandes.{export_format}"'
+        return response
+
+
+class DemandeStatsView(APIView):
+    """
+    Retourne toutes les statistiques du tableau de bord (total, par statut, domaine,
+    type et municipalité, taux de traitement), lues depuis DemandeCounter et mises en cache.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_stats())
+
+
+class DemandeAnalyticsView(APIView):
+    """
+    Retourne le nombre de demandes par période (?period=day|week|month), groupé
+    par statut, domaine ou municipalité (?group_by=), sur created_at ou treated_at
+    (?date_field=), entre ?start= et ?end= (dates ISO). Accepte les filtres de la liste.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        period = request.query_params.get('period', 'month')
+        group_by = request.query_params.get('group_by', 'statut')
+        date_field = request.query_params.get('date_field', 'created_at')
+        if period not in TREND_PERIODS:
+            return Response({'error': 'Invalid period'}, status=status.HTTP_400_BAD_REQUEST)
+        if group_by not in TREND_GROUPS:
+            return Response({'error': 'Invalid group_by'}, status=status.HTTP_400_BAD_REQUEST)
+        if date_field not in TREND_DATE_FIELDS:
+            return Response({'error': 'Invalid date_field'}, status=status.HTTP_400_BAD_REQUEST)
+
+        demandes = filter_demandes(Demande.objects.all(), request.query_params)
+        for param, lookup in (('start', 'gte'), ('end', 'lt')):
+            value = request.query_params.get(param)
+            if value:
+                date = parse_date_param(value)
+                if date is None:
+                    return Response({'error': f'Invalid {param} date'}, status=status.HTTP_400_BAD_REQUEST)
+                demandes = demandes.filter(**{f'{date_field}__{lookup}': date})
+
+        return Response({
+            'period': period,
+            'group_by': group_by,
+            'date_field': date_field,
+            'results': get_trends(demandes, request.query_params.urlencode(), period, group_by, date_field),
+        })
+
+
 class DemandeTotaleView(APIView):
     """
     Retourne le nombre total de demandes enregistrées.
@@ -176,7 +325,7 @@ class DemandeTotaleView(APIView):
 
     def get(self, request):
         try:
-            total_demandes = Demande.objects.count()
+            total_demandes = get_stats()['total']
             return Response({'total_demandes': total_demandes})
         except Exception as e:
             return Response({'error': str(e)}, status=500) 
@@ -189,7 +338,7 @@ class TraiteTotaleView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        total_traite = Demande.objects.filter(statut='traité').count()
+        total_traite = get_stats()['statut']['traité']
         return Response({'total_demandes_traitees': total_traite})
 
 
@@ -200,13 +349,91 @@ class TauxTraitementView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        total_demandes = Demande.objects.count()
-        total_traite = Demande.objects.filter(statut='traité').count()
-        
-        if total_demandes == 0:
-            taux_traitement = 0  # Eviter une division par zéro
-        else:
-            taux_traitement = (total_traite / total_demandes) * 100
-        
-        return Response({'taux_traitement': round(taux_traitement, 2)})
+        return Response({'taux_traitement': get_stats()['taux_traitement']})
+
+
+class SignedAttachmentURL(permissions.BasePermission):
+    """URL de pièce jointe signée (check_url_token), sans authentification."""
 
+    def has_permission(self, request, view):
+        return check_url_token(request.query_params.get('token'), view.kwargs['pk'], request.query_params.get('variant'))
+
+
+class DemandePieceJointeView(APIView):
+    """
+    Téléchargement de la pièce jointe d'une demande (?variant=thumbnail ou web pour les images,
+    l'original est servi tant que la variante n'est pas prête). Gère Range, If-Range et If-None-Match.
+    Jeton JWT, ou ?token= signé pour cette demande et cette variante (URLs de la liste, <img src>).
+    """
+    permission_classes = [IsAuthenticated | SignedAttachmentURL]
+
+    def get(self, request, pk):
+        variant = request.query_params.get('variant')
+        if variant and variant not in VARIANTS:
+            return Response({'error': f"Invalid variant, expected one of: {', '.join(VARIANTS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        demande = Demande.objects.filter(pk=pk).only('piece_jointe').first()
+        if demande is None or not demande.piece_jointe:
+            return Response({'error': 'Piece jointe not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            name, etag, content_type, size = attachment_file(demande.piece_jointe, variant)
+        except FileNotFoundError:
+            return Response({'error': 'Piece jointe not found'}, status=status.HTTP_404_NOT_FOUND)
+        return serve_attachment(request, name, etag, content_type, size, os.path.basename(name))
+
+
+class AttachmentUploadView(APIView):
+    """
+    Envoi d'une pièce jointe par morceaux. POST {"filename", "size"} crée l'envoi ;
+    PUT uploads/<id>/ avec l'en-tête Upload-Offset et les octets bruts en corps ajoute un morceau ;
+    GET uploads/<id>/ donne la position de reprise. Une fois terminé, l'id est passé
+    dans le champ "upload" de POST demandes/.
+    """
+    permission_classes = [AllowAny]  # Comme la création de demande
+
+    def serialize(self, upload):
+        return {
+            'id': str(upload.id),
+            'filename': upload.filename,
+            'size': upload.size,
+            'offset': upload.received,
+            'status': upload.status,
+        }
+
+    def post(self, request):
+        filename = request.data.get('filename')
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            size = None
+        if not filename or size is None:
+            return Response({'error': 'filename and size are required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = create_upload(filename, size)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.serialize(upload), status=status.HTTP_201_CREATED)
+
+    def get(self, request, pk):
+        try:
+            upload = AttachmentUpload.objects.get(pk=pk)
+        except AttachmentUpload.DoesNotExist:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.serialize(upload))
+
+    def put(self, request, pk):
+        if not request.headers.get('Content-Length'):  # Transfer-Encoding: chunked : taille du morceau inconnue
+            return Response({'error': 'Content-Length header is required'}, status=status.HTTP_411_LENGTH_REQUIRED)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset header is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Corps lu en flux depuis la requête : request.data n'est jamais chargé
+            upload = append_chunk(pk, offset, request.stream, length)
+        except AttachmentUpload.DoesNotExist:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        except UploadError as e:
+            upload = AttachmentUpload.objects.get(pk=pk)
+            return Response({'error': str(e), **self.serialize(upload)}, status=status.HTTP_409_CONFLICT)
+        return Response(self.serialize(upload))
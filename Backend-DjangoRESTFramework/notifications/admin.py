@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import EmailJob
+
+class EmailJobAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient_list', 'status', 'attempts', 'run_after', 'created_at')
+    list_filter = ('status',)
+
+admin.site.register(EmailJob, EmailJobAdmin)
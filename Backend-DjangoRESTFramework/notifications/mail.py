@@ -0,0 +1,83 @@
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from Projet_de_stage.metrics import inc, observe
+from .models import EmailJob
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, 'EMAIL_JOB_MAX_ATTEMPTS', 5)
+RETRY_BASE_DELAY = timedelta(seconds=getattr(settings, 'EMAIL_JOB_RETRY_BASE_SECONDS', 30))
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """Même signature que send_mail, mais l'envoi est fait plus tard par le worker."""
+    return EmailJob.objects.create(
+        subject=subject,
+        message=message,
+        from_email=from_email,
+        recipient_list=list(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def send_queued_mail(batch_size=20):
+    """
+    Réclame jusqu'à batch_size jobs dus (SELECT ... FOR UPDATE SKIP LOCKED, donc plusieurs
+    workers ne se gênent pas) et les envoie sur une seule connexion SMTP.
+    Les jobs envoyés sont supprimés ; les échecs sont replanifiés avec un délai exponentiel.
+    Retourne le nombre de jobs traités.
+    """
+    with transaction.atomic():
+        jobs = list(
+            EmailJob.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', run_after__lte=timezone.now())
+            .order_by('run_after', 'id')[:batch_size]
+        )
+        if not jobs:
+            return 0
+
+        sent, failed = [], []
+        connection = get_connection()
+        start = time.perf_counter()
+        try:
+            connection.open()
+            for job in jobs:
+                try:
+                    EmailMessage(
+                        subject=job.subject,
+                        body=job.message,
+                        from_email=job.from_email,
+                        to=job.recipient_list,
+                        connection=connection,
+                    ).send()
+                    sent.append(job.pk)
+                except Exception as e:
+                    failed.append((job, e))
+        except Exception as e:  # Connexion impossible : tout le lot est replanifié
+            failed = [(job, e) for job in jobs if job.pk not in sent]
+        finally:
+            connection.close()
+        observe('mail_send_seconds', time.perf_counter() - start)
+        inc('mail_jobs_total', len(sent), result='sent')
+        inc('mail_jobs_total', len(failed), result='failed')
+
+        for job, error in failed:
+            job.attempts += 1
+            job.last_error = str(error)
+            if job.attempts >= MAX_ATTEMPTS:
+                job.status = 'failed'
+                logger.error(f"Email job {job.pk} failed after {job.attempts} attempts: {error}")
+            else:
+                job.run_after = timezone.now() + retry_delay(job.attempts)
+        EmailJob.objects.bulk_update([job for job, _error in failed], ['attempts', 'last_error', 'status', 'run_after'])
+        EmailJob.objects.filter(pk__in=sent).delete()
+    return len(jobs)
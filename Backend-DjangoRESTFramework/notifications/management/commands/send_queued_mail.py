@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from notifications.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = "Worker d'envoi des e-mails en attente (table EmailJob)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--sleep', type=float, default=2.0, help='Pause (secondes) quand la file est vide')
+        parser.add_argument('--once', action='store_true', help='Vide la file puis s\'arrête')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = send_queued_mail(batch_size=options['batch_size'])
+            if processed:
+                self.stdout.write(f'{processed} job(s) traité(s)')
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['sleep'])
@@ -0,0 +1,29 @@
+from django.db import models
+from django.utils import timezone
+
+
+# Model EmailJob : e-mail en attente d'envoi (outbox), traité par la commande send_queued_mail
+class EmailJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),  # Nombre maximal de tentatives atteint
+    ]
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipient_list = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Réclamation des jobs : WHERE status = 'pending' AND run_after <= now() ORDER BY run_after
+            models.Index(fields=['run_after'], condition=models.Q(status='pending'), name='emailjob_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipient_list)}"
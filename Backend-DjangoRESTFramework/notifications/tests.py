@@ -0,0 +1,43 @@
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .mail import queue_mail, send_queued_mail
+from .models import EmailJob
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP unavailable')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class SendQueuedMailTests(TestCase):
+    def test_queue_mail_does_not_send(self):
+        queue_mail('Sujet', 'Message', 'from@example.com', ['to@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailJob.objects.filter(status='pending').count(), 1)
+
+    def test_worker_sends_and_deletes_jobs(self):
+        for i in range(3):
+            queue_mail(f'Sujet {i}', 'Message', 'from@example.com', [f'to{i}@example.com'])
+        self.assertEqual(send_queued_mail(batch_size=2), 2)
+        self.assertEqual(send_queued_mail(batch_size=2), 1)
+        self.assertEqual(send_queued_mail(batch_size=2), 0)
+        self.assertEqual([message.subject for message in mail.outbox], ['Sujet 0', 'Sujet 1', 'Sujet 2'])
+        self.assertFalse(EmailJob.objects.exists())
+
+    @override_settings(EMAIL_BACKEND='notifications.tests.FailingBackend')
+    def test_failures_are_retried_with_backoff(self):
+        job = queue_mail('Sujet', 'Message', 'from@example.com', ['to@example.com'])
+        self.assertEqual(send_queued_mail(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertIn('SMTP unavailable', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(send_queued_mail(), 0)  # Pas encore dû
+
+        EmailJob.objects.filter(pk=job.pk).update(run_after=timezone.now(), attempts=4)
+        send_queued_mail()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 5))
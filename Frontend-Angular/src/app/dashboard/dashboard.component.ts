@@ -13,7 +13,7 @@ import { Chart } from 'chart.js/auto';
 export class DashboardComponent implements OnInit, AfterViewInit {
   currentLanguage: string = 'fr'; // Langue par défaut
   isLoggedIn: boolean = true; // Vérification de la connexion
-  demandes: Demande[] = []; // Liste des demandes récupérées depuis l'API
+  stats: DemandeStats | null = null; // Statistiques récupérées depuis l'API (/demandes/stats/)
   totalDemandes: number = 0; // Nombre total de demandes
   traitesDemandes: number = 0; // Nombre de demandes traitées
   tauxTraitement: number = 0; // Pourcentage de demandes traitées
@@ -66,52 +66,32 @@ export class DashboardComponent implements OnInit, AfterViewInit {
       'Content-Type': 'application/json',
     });
 
-    this.http.get<Demande[]>('http://localhost:8000/demandes/', { headers })
+    // Compteurs calculés côté serveur : justes quel que soit le nombre de demandes
+    this.http.get<DemandeStats>('http://localhost:8000/demandes/stats/', { headers })
       .subscribe(
         (response) => {
-          if (Array.isArray(response)) {
-            this.demandes = response;
-
-            // Calculer les statistiques
-            this.totalDemandes = this.getTotalDemandes();
-            this.traitesDemandes = this.getDemandesTraitees();
-            this.tauxTraitement = this.getTauxTraitement();
+          this.stats = response;
+          this.totalDemandes = response.total;
+          this.traitesDemandes = response.statut['traité'] || 0;
+          this.tauxTraitement = response.taux_traitement;
 
-            // Appeler les fonctions pour générer les graphiques
-            this.generateStatsChart();
-            this.generateMunicipalityChart();
-          } else {
-            console.error('La réponse du serveur n\'est pas un tableau de demandes :', response);
-          }
+          // Appeler les fonctions pour générer les graphiques
+          this.generateStatsChart();
+          this.generateMunicipalityChart();
         },
         (error) => {
-          console.error('Erreur lors de la récupération des demandes:', error);
+          console.error('Erreur lors de la récupération des statistiques:', error);
         }
       );
   }
 
-  // Fonction pour obtenir le nombre total de demandes
-  getTotalDemandes(): number {
-    return this.demandes.length;
-  }
-
-  // Fonction pour obtenir le nombre de demandes traitées
-  getDemandesTraitees(): number {
-    return this.demandes.filter(demande => demande.statut.toLowerCase() === 'traité').length;
-  }
-
-  // Fonction pour calculer le taux de traitement (%)
-  getTauxTraitement(): number {
-    if (this.totalDemandes === 0) return 0; // Éviter division par zéro
-    return parseFloat(((this.traitesDemandes / this.totalDemandes) * 100).toFixed(2)); // Convertir en nombre
-  }
-
   // Fonction pour générer le graphique des statistiques
   generateStatsChart(): void {
+    if (!this.stats) return;
     const stats = {
-      "traité": this.demandes.filter(d => d.statut === 'traité').length,
-      'en cours': this.demandes.filter(d => d.statut === 'en cours').length,
-      'non traité': this.demandes.filter(d => d.statut === 'non traité').length,
+      "traité": this.stats.statut['traité'] || 0,
+      'en cours': this.stats.statut['en cours'] || 0,
+      'non traité': this.stats.statut['non traité'] || 0,
     };
 
     const statusColors: { [key in 'traité' | 'en cours' | 'non traité']: string } = {
@@ -131,7 +111,7 @@ export class DashboardComponent implements OnInit, AfterViewInit {
         labels: Object.keys(stats),
         datasets: [{
           label: 'Pourcentage des demandes',
-          data: Object.values(stats).map(value => (value / this.demandes.length) * 100),
+          data: Object.values(stats).map(value => this.totalDemandes ? (value / this.totalDemandes) * 100 : 0),
           backgroundColor: Object.keys(stats).map(key => statusColors[key as 'traité' | 'en cours' | 'non traité']),
           borderRadius: 5,
         }],
@@ -160,15 +140,12 @@ export class DashboardComponent implements OnInit, AfterViewInit {
 
   // Fonction pour générer le graphique des municipalités
   generateMunicipalityChart(): void {
+    if (!this.stats) return;
     const municipalityStats: { [key: string]: number } = {};
   
-    // Loop through demandes and count the occurrences of each municipality
-    this.demandes.forEach(demande => {
-      // Directly access name_francais from the 'municipalite' object in Demande
-      const municipalityName = demande.municipalite ? demande.municipalite.name_francais : 'Unknown';
-  
-      // Update the count for the municipality
-      municipalityStats[municipalityName] = (municipalityStats[municipalityName] || 0) + 1;
+    // Nombre de demandes par municipalité, calculé par le serveur
+    this.stats.municipalite.forEach(municipalite => {
+      municipalityStats[municipalite.name_francais] = municipalite.total;
     });
   
     // Destroy the previous chart if it exists
@@ -185,7 +162,7 @@ export class DashboardComponent implements OnInit, AfterViewInit {
       data: {
         labels: Object.keys(municipalityStats),
         datasets: [{
-          data: Object.values(municipalityStats).map(value => (value / this.demandes.length) * 100),
+          data: Object.values(municipalityStats).map(value => this.totalDemandes ? (value / this.totalDemandes) * 100 : 0),
           backgroundColor: ["#689D71", "#94a3b8", "#64748b", "#475569"], // You can adjust colors here
         }],
       },
@@ -267,3 +244,13 @@ export interface Municipalite {
   id: string;
   name_francais: string;
 }
+
+// Réponse de /demandes/stats/
+export interface DemandeStats {
+  total: number;
+  statut: { [statut: string]: number };
+  domaine: { [domaine: string]: number };
+  request_type: { [type: string]: number };
+  municipalite: { id: string; name_francais: string; total: number }[];
+  taux_traitement: number;
+}
@@ -1,13 +1,13 @@
 import { Component,OnInit } from '@angular/core';
 import { TranslateService } from '@ngx-translate/core';
 import { HttpClient, HttpHeaders } from '@angular/common/http';
+import { DemandeStats } from '../dashboard/dashboard.component';
 @Component({
   selector: 'app-home',
   templateUrl: './home.component.html',
   styleUrls: ['./home.component.scss']
 })
 export class HomeComponent implements OnInit {
-  demandes: Demande[] = [];
   totalDemandes: number = 0;
   traitesDemandes: number = 0;
   tauxTraitement: number = 0;
@@ -34,41 +34,19 @@ export class HomeComponent implements OnInit {
       'Content-Type': 'application/json',
     });
 
-    this.http.get<Demande[]>('http://localhost:8000/demandes/', { headers })
+    // Compteurs calculés côté serveur : justes quel que soit le nombre de demandes
+    this.http.get<DemandeStats>('http://localhost:8000/demandes/stats/', { headers })
       .subscribe(
         (response) => {
-          if (Array.isArray(response)) {
-            this.demandes = response;
-
-            // Calculer les statistiques
-            this.totalDemandes = this.getTotalDemandes();
-            this.traitesDemandes = this.getDemandesTraitees();
-            this.tauxTraitement = this.getTauxTraitement();
-          } else {
-            console.error('La réponse du serveur n\'est pas un tableau de demandes :', response);
-          }
+          this.totalDemandes = response.total;
+          this.traitesDemandes = response.statut['traité'] || 0;
+          this.tauxTraitement = response.taux_traitement;
         },
         (error) => {
-          console.error('Erreur lors de la récupération des demandes:', error);
+          console.error('Erreur lors de la récupération des statistiques:', error);
         }
       );
   }
-
-  // Fonction pour obtenir le nombre total de demandes
-  getTotalDemandes(): number {
-    return this.demandes.length;
-  }
-
-  // Fonction pour obtenir le nombre de demandes traitées
-  getDemandesTraitees(): number {
-    return this.demandes.filter(demande => demande.statut.toLowerCase() === 'traité').length;
-  }
-
-  // Fonction pour calculer le taux de traitement (%)
-  getTauxTraitement(): number {
-    if (this.totalDemandes === 0) return 0; // Éviter division par zéro
-    return parseFloat(((this.traitesDemandes / this.totalDemandes) * 100).toFixed(2)); // Convertir en nombre
-  }
 }
 export interface Demande {
   id: string;
@@ -2,7 +2,7 @@ import { Component, OnInit } from '@angular/core';
 import { TranslateService } from '@ngx-translate/core';
 import { FormBuilder, FormGroup, Validators, AbstractControl, ValidationErrors, ValidatorFn } from '@angular/forms';
 import Swal from 'sweetalert2';
-import { HttpClient, HttpHeaders } from '@angular/common/http';
+import { HttpClient } from '@angular/common/http';
 @Component({
   selector: 'app-suivdemande',
   templateUrl: './suivdemande.component.html',
@@ -54,40 +54,19 @@ export class SuivdemandeComponent implements OnInit {
       const key = this.trackingForm.get('key')?.value;
       if (key && key.length === 6) {
   
-        // Récupération des données depuis l'API
-        const token = localStorage.getItem('access_token');
-        if (!token) {
-          console.error('Le token est nul. Veuillez vous reconnecter.');
-          return;
-        }
-  
-        const headers = new HttpHeaders({
-          'Authorization': `Bearer ${token}`,
-          'Content-Type': 'application/json',
-        });
-  
-        console.log('Headers:', headers.keys());
-  
-        this.http.get<Demande[]>('http://localhost:8000/demandes/', { headers })
+        // Suivi public par clé : une seule demande lue, sans parcourir la liste
+        this.http.get<Demande>(`http://localhost:8000/demandes/${encodeURIComponent(key.toUpperCase())}/`)
           .subscribe(
-            (response) => {
-              if (Array.isArray(response)) {
-                // Filtrage de la demande correspondante au key
-                const demandeTrouvee = response.find(demande => demande.key === key);
-                if (demandeTrouvee) {
-                  this.demandes = [demandeTrouvee]; // Afficher la demande correspondante
-                } else {
-                  console.error('Aucune demande trouvée pour ce code de suivi');
-                  this.demandes = []; // Si aucune demande correspondante n'est trouvée
-                }
-              } else {
-                console.error('La réponse du serveur n\'est pas un tableau de demandes :', response);
-                this.demandes = []; // Réinitialiser en cas de réponse invalide
-              }
+            (demande) => {
+              this.demandes = [demande]; // Afficher la demande correspondante
             },
             (error) => {
-              console.error('Erreur lors de la récupération des demandes:', error);
-              this.demandes = []; // Réinitialiser les données en cas d'erreur
+              if (error.status === 404) {
+                console.error('Aucune demande trouvée pour ce code de suivi');
+              } else {
+                console.error('Erreur lors de la récupération de la demande:', error);
+              }
+              this.demandes = []; // Si aucune demande correspondante n'est trouvée
             }
           );
         